@@ -3,6 +3,11 @@ ASGI config for AgriRentX project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with an ASGI server so the async views (OTP signin, invoice mail,
+stock notifications) can wait on SMTP without holding a worker, e.g.::
+
+    uvicorn AgriRentX.asgi:application --workers 4
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
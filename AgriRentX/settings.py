@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -77,9 +79,82 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'agriculture.sqlite3',
+    },
+    # Analytics, pricing and export reads, see main/routers.py. Locally this is a
+    # read-only second connection to the same file; in production point it at a
+    # streaming replica of the primary.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('REPLICA_DATABASE_NAME', f"file:{BASE_DIR / 'agriculture.sqlite3'}?mode=ro"),
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+DATABASE_ROUTERS = ['main.routers.ReplicaRouter']
+REPLICA_DATABASE = 'replica'
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Use a shared backend (Redis/Memcached) in production so all workers see the same entries
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'agrirentx',
     }
 }
 
+# Full-page cache for anonymous landing/about/contact visits
+PAGE_CACHE_TIMEOUT = int(os.environ.get('PAGE_CACHE_TIMEOUT', 600))  # seconds, 0 disables
+PAGE_CACHE_VERSION = os.environ.get('AGRIRENTX_RELEASE', '1')  # bump on deploy
+
+# Dashboard fragments are invalidated by model version counters; this only bounds staleness of time-based badges
+FRAGMENT_CACHE_TIMEOUT = int(os.environ.get('FRAGMENT_CACHE_TIMEOUT', 600))  # seconds
+
+# Demand forecasts on admin_analytics are rebuilt at most this often
+ANALYTICS_CACHE_TIMEOUT = int(os.environ.get('ANALYTICS_CACHE_TIMEOUT', 3600))  # seconds
+
+# Price suggestions: utilization window, the utilization that keeps a price steady,
+# the largest change suggested either way and the smallest worth suggesting
+PRICING_WINDOW_DAYS = 30
+PRICING_TARGET_UTILIZATION = 0.6
+PRICING_MAX_CHANGE = 0.2
+PRICING_MIN_CHANGE = 0.02
+
+# Closed rentals move to the archive table this many days after they were settled
+RENTAL_ARCHIVE_AFTER_DAYS = int(os.environ.get('RENTAL_ARCHIVE_AFTER_DAYS', 180))
+
+# Signin OTPs live in the cache, hashed, and expire after OTP_TTL seconds
+OTP_TTL = 300
+OTP_MAX_ATTEMPTS = 5  # wrong guesses before the OTP is discarded
+# OTP mail token buckets: (burst size, seconds to earn one more send)
+OTP_USER_THROTTLE = (3, 120)
+OTP_IP_THROTTLE = (20, 30)
+
+
+# Requests slower than this are logged with their heaviest SQL statements
+SLOW_REQUEST_THRESHOLD_MS = int(os.environ.get('SLOW_REQUEST_THRESHOLD_MS', 500))
+
+# Addresses allowed to scrape /metrics
+METRICS_ALLOWED_IPS = os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'main': {
+            'handlers': ['console'],
+            'level': os.environ.get('AGRIRENTX_LOG_LEVEL', 'INFO'),
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -0,0 +1,284 @@
+"""Category demand forecasts and fleet utilization for admin_analytics.
+
+For demand, the database bins rentals into (day, category) counts, so only
+a few thousand rows leave it however long the history is. numpy then
+builds a categories x weeks matrix and computes every category's moving
+average, week-of-year seasonality, trend and forecast at once. Reports are
+cached for ANALYTICS_CACHE_TIMEOUT seconds.
+
+Utilization sweeps each item's rental intervals, sorted by start day, to
+count the days it was out, so any window is computed on demand.
+
+Both read live and archived rentals (main/archive.py). numpy is optional;
+without it both reports return None and the page leaves their sections out.
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce, Substr, TruncDate
+from django.utils import timezone
+
+from .archive import rental_history
+from .models import AgricultureItem
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+HISTORY_WEEKS = 156
+FORECAST_WEEKS = 8
+MOVING_AVERAGE_WEEKS = 4
+TREND_WEEKS = 26
+CHART_WEEKS = 26
+
+
+# ------------------ SERIES ------------------
+def _day(field):
+    """A datetime column truncated to the local day inside the database"""
+    # SQLite stores UTC text; TruncDate there calls back into Python for every row
+    if connection.vendor == 'sqlite' and timezone.get_current_timezone_name() == 'UTC':
+        return Substr(field, 1, 10)
+    return TruncDate(field)
+
+
+def _midnight(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _day_numbers(days):
+    """Days as returned by _day() to int64 days since the epoch; None becomes -1"""
+    return np.array([day or '1969-12-31' for day in days], dtype='datetime64[D]').astype(np.int64)
+
+
+def weekly_category_counts(categories, start, weeks):
+    """categories x weeks matrix of rental requests, weeks starting on ``start``"""
+    rows = list(rental_history(
+        lambda rentals: rentals.filter(request_date__gte=_midnight(start))
+        .annotate(day=_day('request_date'))
+        .values_list('day', 'item__category')
+        .annotate(count=Count('id'))
+    ))
+    index = {category: i for i, category in enumerate(categories)}
+    daily = np.zeros((len(categories), weeks * 7), dtype=np.int64)
+    if rows:
+        days, names, counts = zip(*rows)
+        offsets = (np.array(days, dtype='datetime64[D]') - np.datetime64(start)).astype(np.int64)
+        rows_of = np.array([index.get(name, -1) for name in names])
+        keep = (rows_of >= 0) & (offsets < weeks * 7)
+        np.add.at(daily, (rows_of[keep], offsets[keep]), np.array(counts)[keep])
+    return daily.reshape(len(categories), weeks, 7).sum(axis=2)
+
+
+def moving_average(series, window):
+    """Trailing moving average along the last axis; early points average what exists"""
+    totals = np.cumsum(series, axis=-1, dtype=float)
+    totals[..., window:] = totals[..., window:] - totals[..., :-window]
+    sizes = np.minimum(np.arange(1, series.shape[-1] + 1), window)
+    return totals / sizes
+
+
+def seasonal_factors(weekly, week_of_year):
+    """Demand in each week of the year relative to the category's mean, shape categories x 53.
+
+    Needs a full year of history; until then every factor is 1.
+    """
+    factors = np.ones((weekly.shape[0], 53))
+    if weekly.shape[1] < 52:
+        return factors
+    sums = np.zeros_like(factors)
+    seen = np.bincount(week_of_year, minlength=53)
+    np.add.at(sums.T, week_of_year, weekly.T)
+    observed = seen > 0
+    means = sums[:, observed] / seen[observed]
+    # Smooth over neighbouring weeks so one busy week doesn't become a season
+    means = (np.roll(means, 1, axis=1) + means + np.roll(means, -1, axis=1)) / 3
+    level = means.mean(axis=1, keepdims=True)
+    factors[:, observed] = np.divide(means, level, out=np.ones_like(means), where=level > 0)
+    return factors
+
+
+def forecast(weekly, week_of_year, future_week_of_year):
+    """Seasonal linear-trend forecast for every category at once.
+
+    Returns (forecast, slope): forecast has one column per future week and
+    slope is the deseasonalized change in rentals per week.
+    """
+    factors = seasonal_factors(weekly, week_of_year)
+    recent, recent_factors = weekly[:, -TREND_WEEKS:].astype(float), factors[:, week_of_year[-TREND_WEEKS:]]
+    # A week of the year with no history has factor 0; leave those weeks as they are
+    recent = np.divide(recent, recent_factors, out=recent, where=recent_factors > 0)
+    x = np.arange(recent.shape[1], dtype=float)
+    x -= x.mean()
+    slope = (recent * x).sum(axis=1) / max((x * x).sum(), 1)
+    level = recent.mean(axis=1) + slope * x[-1]
+    steps = np.arange(1, len(future_week_of_year) + 1)
+    predicted = (level[:, None] + slope[:, None] * steps) * factors[:, future_week_of_year]
+    return np.clip(predicted, 0, None), slope
+
+
+# ------------------ REPORT ------------------
+def _week_of_year(starts):
+    return np.array([day.isocalendar()[1] - 1 for day in starts])
+
+
+def build_demand_report(history_weeks=HISTORY_WEEKS, horizon=FORECAST_WEEKS):
+    """Per-category demand history, forecast and fleet load, plus chart labels"""
+    today = timezone.localdate()
+    start = today - timedelta(weeks=history_weeks) + timedelta(days=1)
+    week_starts = [start + timedelta(weeks=i) for i in range(history_weeks)]
+    future_starts = [week_starts[-1] + timedelta(weeks=i) for i in range(1, horizon + 1)]
+
+    fleet = {
+        row['category']: row
+        for row in AgricultureItem.objects.values('category').annotate(
+            items=Count('id'), active=Sum('active_rental_count'),
+        )
+    }
+    categories = sorted(fleet)
+    if not categories:
+        return {'categories': [], 'history_labels': [], 'forecast_labels': []}
+
+    weekly = weekly_category_counts(categories, start, history_weeks)
+    predicted, slope = forecast(weekly, _week_of_year(week_starts), _week_of_year(future_starts))
+    averages = moving_average(weekly, MOVING_AVERAGE_WEEKS)
+
+    report = []
+    for i, category in enumerate(categories):
+        items, active = fleet[category]['items'], fleet[category]['active'] or 0
+        average = float(averages[i, -1])
+        report.append({
+            'category': category,
+            'items': items,
+            'active': active,
+            'utilization_pct': round(100 * active / items, 1) if items else 0,
+            'weekly_average': round(average, 1),
+            'weekly_per_item': round(average / items, 2) if items else 0,
+            'trend_pct': round(100 * float(slope[i]) / average, 1) if average else 0,
+            'forecast': [round(float(value), 1) for value in predicted[i]],
+            'forecast_total': round(float(predicted[i].sum())),
+            'history': weekly[i, -CHART_WEEKS:].tolist(),
+        })
+    return {
+        'categories': report,
+        'history_labels': [day.strftime('%d %b') for day in week_starts[-CHART_WEEKS:]],
+        'forecast_labels': [day.strftime('%d %b') for day in future_starts],
+    }
+
+
+def demand_report(history_weeks=HISTORY_WEEKS, horizon=FORECAST_WEEKS):
+    """Cached build_demand_report(); None when numpy is not installed"""
+    if np is None:
+        return None
+    key = f"analytics:demand:{timezone.localdate()}:{history_weeks}:{horizon}"
+    return cache.get_or_set(
+        key, lambda: build_demand_report(history_weeks, horizon), settings.ANALYTICS_CACHE_TIMEOUT,
+    )
+
+
+# ------------------ UTILIZATION ------------------
+# Rentals whose item actually went out; pending and rejected ones never left the yard
+RENTED_STATUSES = ('approved', 'returned', 'damaged')
+UTILIZATION_RANKED = 10  # busiest and idlest items listed
+
+
+def rented_days(item_index, starts, ends):
+    """Days covered by the union of each item's [start, end) day intervals.
+
+    Intervals of one item are shifted into their own range so a single sort
+    and running maximum sweeps every item at once; overlapping or repeated
+    intervals are only counted once.
+    """
+    if len(starts) == 0:
+        return np.zeros(0, dtype=np.int64)
+    span = int(ends.max() - starts.min()) + 1
+    shift = item_index.astype(np.int64) * span - starts.min()
+    starts, ends = starts + shift, ends + shift
+    order = np.argsort(starts, kind='stable')
+    starts, ends, item_index = starts[order], ends[order], item_index[order]
+    # Furthest day already covered before each interval begins
+    covered = np.maximum.accumulate(ends)
+    covered = np.concatenate(([starts[0]], covered[:-1]))
+    added = np.clip(ends - np.maximum(starts, covered), 0, None)
+    return np.bincount(item_index, weights=added).astype(np.int64)
+
+
+def item_utilization(start, end):
+    """Every item as (items, rented, in_fleet) for ``start`` to ``end`` inclusive.
+
+    ``items`` lists (id, name, category) by id; the two arrays hold the days
+    each item was out on rental and the days it was part of the fleet. A
+    rental counts from its approval day until its return day, or until
+    ``end`` while still out. Rentals approved before approved_at was recorded
+    count from their request day.
+    """
+    first, last = np.datetime64(start, 'D').astype(np.int64), np.datetime64(end, 'D').astype(np.int64) + 1
+    rows = list(rental_history(
+        lambda rentals: rentals.annotate(out_at=Coalesce('approved_at', 'request_date'))
+        .filter(status__in=RENTED_STATUSES, out_at__lt=_midnight(end + timedelta(days=1)))
+        # Only approved rentals are still out; a closed one without a return date can't be placed
+        .filter(Q(status='approved') | Q(return_date__isnull=False))
+        .exclude(return_date__lt=_midnight(start))
+        .annotate(start=_day('out_at'), end=_day('return_date'))
+        .values_list('item_id', 'start', 'end')
+    ))
+    items = list(
+        AgricultureItem.objects.annotate(added=_day('created_at'))
+        .order_by('id').values_list('id', 'name', 'category', 'added')
+    )
+    ids = np.array([item[0] for item in items], dtype=np.int64)
+    # Days each item was in the fleet during the window
+    in_fleet = np.clip(last - np.maximum(_day_numbers([item[3] for item in items]), first), 0, None)
+    rented = np.zeros(len(items), dtype=np.int64)
+    if rows:
+        item_ids, rental_starts, rental_ends = zip(*rows)
+        rental_starts, rental_ends = _day_numbers(rental_starts), _day_numbers(rental_ends)
+        # Still out: rented through the end of the window; returned: through the return day
+        rental_ends = np.where(rental_ends < 0, last, rental_ends + 1)
+        index = np.searchsorted(ids, item_ids)
+        counts = rented_days(index, np.clip(rental_starts, first, last), np.clip(rental_ends, first, last))
+        rented[:len(counts)] = counts
+    return [item[:3] for item in items], np.minimum(rented, in_fleet), in_fleet
+
+
+def utilization_report(start, end):
+    """Days rented versus days in the fleet for each item and category, ``start`` to ``end`` inclusive"""
+    if np is None:
+        return None
+    items, rented, in_fleet = item_utilization(start, end)
+    if not items:
+        return {'items': [], 'categories': [], 'busiest': [], 'idlest': [], 'start': start, 'end': end}
+
+    per_item = [
+        {
+            'id': item_id, 'name': name, 'category': category,
+            'rented_days': int(days), 'fleet_days': int(fleet_days),
+            'utilization_pct': round(float(100 * days / fleet_days), 1) if fleet_days else 0,
+        }
+        for (item_id, name, category), days, fleet_days in zip(items, rented, in_fleet)
+    ]
+    categories, category_index = np.unique([item[2] for item in items], return_inverse=True)
+    category_rented = np.bincount(category_index, weights=rented, minlength=len(categories))
+    category_fleet = np.bincount(category_index, weights=in_fleet, minlength=len(categories))
+    per_category = [
+        {
+            'category': category, 'items': int(count),
+            'rented_days': int(days), 'idle_days': int(fleet_days - days),
+            'utilization_pct': round(float(100 * days / fleet_days), 1) if fleet_days else 0,
+        }
+        for category, count, days, fleet_days in zip(
+            categories.tolist(), np.bincount(category_index), category_rented, category_fleet,
+        )
+    ]
+    ranked = sorted(per_item, key=lambda item: (-item['utilization_pct'], item['id']))
+    return {
+        'items': per_item,
+        'categories': per_category,
+        'busiest': ranked[:UTILIZATION_RANKED],
+        'idlest': ranked[::-1][:UTILIZATION_RANKED],
+        'start': start,
+        'end': end,
+    }
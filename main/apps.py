@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class MainConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'main'
+
+    def ready(self):
+        from django.conf import settings
+
+        from . import signals  # noqa: F401
+        from .middleware import time_templates
+        # Only time templates when the middleware that reports it is installed
+        if 'main.middleware.PerformanceMiddleware' in settings.MIDDLEWARE:
+            time_templates()
@@ -0,0 +1,103 @@
+"""Hot/cold split of the rental history.
+
+RentalRequest holds the rentals the dashboards work on. archive_rentals()
+moves closed rentals settled more than RENTAL_ARCHIVE_AFTER_DAYS ago into
+ArchivedRentalRequest in batches, keeping their ids, so invoice links stay
+valid. Each batch is copied with INSERT ... SELECT and then deleted, so
+rows never pass through Python. Reports that need the whole history read both tables through
+rental_history() and get_rental_or_404().
+
+The delete is plain SQL too: archived rentals still count in the item
+counters (main/counters.py), so the post_delete receivers must not run.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.functions import Coalesce
+from django.http import Http404
+from django.utils import timezone
+
+from .caching import bump_model_version
+from .models import ArchivedRentalRequest, RentalRequest
+
+RENTAL_MODELS = (RentalRequest, ArchivedRentalRequest)
+
+# Columns copied into the archive; both tables name them the same
+ARCHIVED_COLUMNS = [field.column for field in RentalRequest._meta.concrete_fields]
+
+
+# ------------------ UNIFIED READS ------------------
+def rental_history(query):
+    """``query`` applied to the live and archived rentals, as one UNION ALL queryset.
+
+    ``query`` takes a manager's queryset and returns a values()/values_list()
+    query; it runs once per table, so both halves have the same columns.
+    """
+    live, archived = (query(model.objects.order_by()) for model in RENTAL_MODELS)
+    return live.union(archived, all=True)
+
+
+def get_rental_or_404(rental_id):
+    """A rental by id with its user and item, live or archived"""
+    for model in RENTAL_MODELS:
+        rental = model.objects.select_related('user', 'item').filter(id=rental_id).first()
+        if rental is not None:
+            return rental
+    raise Http404("No RentalRequest matches the given query.")
+
+
+# ------------------ ARCHIVING ------------------
+def archivable_rentals(days=None):
+    """Closed rentals settled more than ``days`` ago, with no refund still owed"""
+    days = settings.RENTAL_ARCHIVE_AFTER_DAYS if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+    return (
+        RentalRequest.objects.filter(status__in=RentalRequest.CLOSED_STATUSES)
+        .exclude(refund_processed=False, refund_amount__gt=0)
+        .annotate(settled=Coalesce('refund_date', 'return_date', 'request_date'))
+        .filter(settled__lt=cutoff)
+    )
+
+
+def _move_rows(ids):
+    """Copy live rentals into the archive and delete them, inside the database"""
+    quote = connection.ops.quote_name
+    live, archive = quote(RentalRequest._meta.db_table), quote(ArchivedRentalRequest._meta.db_table)
+    columns = ", ".join(quote(column) for column in ARCHIVED_COLUMNS)
+    where = "{} IN ({})".format(quote('id'), ", ".join(["%s"] * len(ids)))
+    archived_at = connection.ops.adapt_datetimefield_value(timezone.now())
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {archive} ({columns}, {quote('archived_at')}) SELECT {columns}, %s FROM {live} WHERE {where}",
+            [archived_at, *ids],
+        )
+        cursor.execute(f"DELETE FROM {live} WHERE {where}", ids)
+    bump_model_version(RentalRequest._meta.label_lower)
+
+
+def archive_batch(ids, days=None):
+    """Move the given rentals, if still archivable, in one transaction; returns how many moved"""
+    with transaction.atomic():
+        ids = list(archivable_rentals(days).select_for_update().filter(id__in=ids).values_list('id', flat=True))
+        if ids:
+            _move_rows(ids)
+    return len(ids)
+
+
+def archive_rentals(days=None, batch_size=1000, limit=None):
+    """Archive every archivable rental, ``batch_size`` per transaction; yields each batch's count"""
+    moved = last_id = 0
+    while limit is None or moved < limit:
+        size = batch_size if limit is None else min(batch_size, limit - moved)
+        # Walk ids upwards so a row that stops qualifying is not picked again
+        ids = list(
+            archivable_rentals(days).filter(id__gt=last_id)
+            .order_by('id').values_list('id', flat=True)[:size]
+        )
+        if not ids:
+            break
+        count = archive_batch(ids, days)
+        moved += count
+        last_id = ids[-1]
+        yield count
@@ -0,0 +1,328 @@
+import asyncio
+import os
+import re
+import statistics
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend as LocmemBackend
+from django.db import connection, connections, OperationalError
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from .models import CustomUser, AgricultureItem, RentalRequest
+from .views import ADMIN_USERNAME, ADMIN_PASSWORD
+
+OTP_PATTERN = re.compile(r'OTP is: (\d{7})')
+
+LIFECYCLE_STEPS = (
+    'user_signup', 'user_signin', 'user_verify_otp', 'verify_aadhaar',
+    'accept_terms', 'process_payment', 'change_rental_status',
+    'return_rental', 'process_refund',
+)
+
+
+# SQLite answers concurrent writers with "database is locked" or "table is
+# locked"; those are retried every LOCK_RETRY_DELAY seconds, this many times
+LOCK_RETRIES = 500
+LOCK_RETRY_DELAY = 0.01
+
+
+class LifecycleError(Exception):
+    """A step of the simulated rental lifecycle did not behave as expected"""
+
+
+def is_lock_error(error):
+    """True for the OperationalErrors SQLite raises when another writer holds the lock"""
+    message = str(error).lower()
+    return 'database is locked' in message or 'table is locked' in message
+
+
+def retry_on_lock(func, *args, **kwargs):
+    """Call ``func``, retrying a bounded number of times while the database is locked"""
+    for attempt in range(LOCK_RETRIES):
+        try:
+            return func(*args, **kwargs)
+        except OperationalError as e:
+            if not is_lock_error(e) or attempt == LOCK_RETRIES - 1:
+                raise
+            time.sleep(LOCK_RETRY_DELAY)
+
+
+# ------------------ TIMINGS ------------------
+class StepTimings:
+    """Thread-safe latency samples and wall-clock span per lifecycle step"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.spans = {}
+        self.errors = defaultdict(int)
+        self._current = threading.local()
+
+    def start(self, step):
+        """Note the step this thread is running, so an unexpected error can be blamed on it"""
+        self._current.step = step
+
+    @property
+    def current_step(self):
+        return getattr(self._current, 'step', None)
+
+    def record(self, step, started, finished):
+        with self._lock:
+            self.samples[step].append(finished - started)
+            first, last = self.spans.get(step, (started, finished))
+            self.spans[step] = (min(first, started), max(last, finished))
+
+    def fail(self, step):
+        with self._lock:
+            self.errors[step] += 1
+
+    def report(self, steps=LIFECYCLE_STEPS):
+        """p50/p95/p99 latency in ms and requests per second for each step"""
+        rows = []
+        for step in steps:
+            samples = sorted(self.samples.get(step, []))
+            if not samples:
+                rows.append({'step': step, 'count': 0, 'errors': self.errors[step]})
+                continue
+            if len(samples) > 1:
+                cuts = statistics.quantiles(samples, n=100, method='inclusive')
+                p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+            else:
+                p50 = p95 = p99 = samples[0]
+            first, last = self.spans[step]
+            rows.append({
+                'step': step,
+                'count': len(samples),
+                'errors': self.errors[step],
+                'p50_ms': p50 * 1000,
+                'p95_ms': p95 * 1000,
+                'p99_ms': p99 * 1000,
+                'rps': len(samples) / max(last - first, 1e-9),
+            })
+        return rows
+
+
+@contextmanager
+def throwaway_database():
+    """Run the block against a fresh test database that is dropped afterwards"""
+    setup_test_environment()
+    # A file-backed SQLite test database lets worker threads wait on locks
+    # instead of failing the way a shared in-memory database does
+    if connection.vendor == 'sqlite':
+        fd, path = tempfile.mkstemp(suffix='.sqlite3', prefix='agrirentx_bench_')
+        os.close(fd)
+        settings.DATABASES['default'].setdefault('TEST', {})['NAME'] = path
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+# ------------------ SIMULATION ------------------
+def _timed(timings, step, func, *args, **kwargs):
+    timings.start(step)
+    started = time.perf_counter()
+
+    def attempt():
+        # Time only the attempt that went through, not the waits for the lock
+        nonlocal started
+        started = time.perf_counter()
+        return func(*args, **kwargs)
+
+    response = retry_on_lock(attempt)
+    timings.record(step, started, time.perf_counter())
+    return response
+
+
+def _expect_redirect(response, step, url):
+    if response.status_code != 302 or response['Location'] != url:
+        raise LifecycleError(f"{step}: expected redirect to {url}, got {response.status_code} {response.get('Location')}")
+
+
+def _latest_otp(email):
+    for message in reversed(mail.outbox):
+        if email in message.to:
+            match = OTP_PATTERN.search(message.body)
+            if match:
+                return match.group(1)
+    raise LifecycleError(f"No OTP mail sent to {email}")
+
+
+def _farmer_ip(index):
+    """A distinct client address per simulated farmer, as OTP mails are throttled per IP"""
+    return f"10.{index >> 16 & 255}.{index >> 8 & 255}.{index & 255}"
+
+
+def _admin_client():
+    client = Client()
+    client.post(reverse('admin_signin'), {'username': ADMIN_USERNAME, 'password': ADMIN_PASSWORD})
+    return client
+
+
+def simulate_farmer(index, run_id, timings):
+    """Drive one farmer through signup, OTP login, booking, payment, return and refund"""
+    username = f"bench_{run_id}_{index}"
+    email = f"{username}@example.com"
+    password = 'bench-pass-123'
+    farmer = Client(REMOTE_ADDR=_farmer_ip(index))
+    admin = _admin_client()
+    dashboard = reverse('user_dashboard')
+    admin_dashboard = reverse('admin_dashboard')
+
+    response = _timed(timings, 'user_signup', farmer.post, reverse('user_signup'), {
+        'username': username, 'email': email, 'phone': '9000000000',
+        'address': 'Benchmark Farm', 'password': password, 'confirm_password': password,
+    })
+    _expect_redirect(response, 'user_signup', reverse('user_signin'))
+
+    response = _timed(timings, 'user_signin', farmer.post, reverse('user_signin'), {'username': username, 'email': email})
+    _expect_redirect(response, 'user_signin', reverse('user_verify_otp'))
+
+    response = _timed(timings, 'user_verify_otp', farmer.post, reverse('user_verify_otp'), {'otp': _latest_otp(email)})
+    _expect_redirect(response, 'user_verify_otp', dashboard)
+
+    user = CustomUser.objects.get(username=username)
+    response = _timed(timings, 'verify_aadhaar', admin.get, reverse('verify_aadhaar', args=[user.id]))
+    _expect_redirect(response, 'verify_aadhaar', admin_dashboard)
+
+    item = AgricultureItem.objects.create(
+        name=f"Bench Tiller {index}", category='Ploughs', description='Benchmark rotary tiller',
+        price_per_day='500.00', added_by=CustomUser.objects.get(username=ADMIN_USERNAME),
+    )
+    response = _timed(timings, 'accept_terms', farmer.post, reverse('accept_terms', args=[item.id]))
+    rental = RentalRequest.objects.get(user=user, item=item)
+    _expect_redirect(response, 'accept_terms', reverse('rental_payment', args=[rental.id]))
+
+    response = _timed(timings, 'process_payment', farmer.post, reverse('process_payment', args=[rental.id]), {'payment_method': 'phonepe'})
+    _expect_redirect(response, 'process_payment', dashboard)
+
+    response = _timed(timings, 'change_rental_status', admin.get, reverse('change_rental_status', args=[rental.id, 'approved']))
+    _expect_redirect(response, 'change_rental_status', admin_dashboard)
+
+    response = _timed(timings, 'return_rental', farmer.post, reverse('return_rental', args=[rental.id]), {'condition': 'good'})
+    _expect_redirect(response, 'return_rental', dashboard)
+
+    response = _timed(timings, 'process_refund', admin.get, reverse('process_refund', args=[rental.id]))
+    _expect_redirect(response, 'process_refund', admin_dashboard)
+
+
+def run_lifecycle_benchmark(users=50, concurrency=8):
+    """Run the full rental lifecycle for many farmers concurrently.
+
+    Expects the locmem mail backend (setup_test_environment) so OTPs can be
+    read from mail.outbox. Returns the StepTimings and the failure messages.
+    """
+    timings = StepTimings()
+    failures = []
+    run_id = int(time.time())
+    _admin_client()  # create the admin account up front
+
+    def worker(index):
+        timings.start(LIFECYCLE_STEPS[0])
+        try:
+            simulate_farmer(index, run_id, timings)
+        except LifecycleError as e:
+            failures.append(str(e))
+            timings.fail(str(e).split(':', 1)[0])
+        except Exception as e:
+            # Any other error fails this farmer's current step, not the whole run
+            step = timings.current_step
+            failures.append(f"{step}: {e.__class__.__name__}: {e}")
+            timings.fail(step)
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(users)))
+    return timings, failures
+
+
+# ------------------ WSGI vs ASGI ------------------
+class SlowMailBackend(LocmemBackend):
+    """locmem backend that takes as long as a remote SMTP server to answer"""
+
+    latency = 0.2
+
+    def send_messages(self, messages):
+        time.sleep(self.latency)
+        return super().send_messages(messages)
+
+    async def asend_messages(self, messages):
+        await asyncio.sleep(self.latency)
+        return super().send_messages(messages)
+
+
+def _signin_users(count, run_id):
+    users = CustomUser.objects.bulk_create(
+        CustomUser(username=f"otp_{run_id}_{i}", email=f"otp_{run_id}_{i}@example.com", status='approved')
+        for i in range(count)
+    )
+    return [{'username': user.username, 'email': user.email} for user in users]
+
+
+def _wsgi_signins(timings, forms, workers):
+    """Each worker thread serves one request at a time, like gunicorn --threads"""
+    url = reverse('user_signin')
+
+    def worker(form):
+        try:
+            response = _timed(timings, 'wsgi', Client().post, url, form)
+            if response.status_code != 302:
+                timings.fail('wsgi')
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(worker, forms))
+
+
+async def _asgi_signins(timings, forms, concurrency):
+    """Up to ``concurrency`` requests in flight on one event loop, like uvicorn"""
+    url = reverse('user_signin')
+    slots = asyncio.Semaphore(concurrency)
+
+    async def request(form):
+        async with slots:
+            # Same bounded retry on SQLite lock errors as retry_on_lock()
+            for attempt in range(LOCK_RETRIES):
+                started = time.perf_counter()
+                try:
+                    response = await AsyncClient().post(url, form)
+                    break
+                except OperationalError as e:
+                    if not is_lock_error(e) or attempt == LOCK_RETRIES - 1:
+                        raise
+                    await asyncio.sleep(LOCK_RETRY_DELAY)
+            timings.record('asgi', started, time.perf_counter())
+            if response.status_code != 302:
+                timings.fail('asgi')
+
+    await asyncio.gather(*(request(form) for form in forms))
+
+
+def run_signin_concurrency_benchmark(requests=200, workers=8, concurrency=200, mail_latency=0.2):
+    """Compare OTP signins served by WSGI worker threads and by one ASGI event loop.
+
+    Mail goes through SlowMailBackend so each request waits ``mail_latency``
+    seconds on "SMTP". WSGI throughput is capped at about workers/latency;
+    ASGI keeps up to ``concurrency`` requests waiting at once.
+    """
+    timings = StepTimings()
+    run_id = int(time.time())
+    SlowMailBackend.latency = mail_latency
+    # Every simulated signin comes from the test client's single address
+    with override_settings(EMAIL_BACKEND='main.benchmarks.SlowMailBackend', OTP_IP_THROTTLE=(2 * requests, 1)):
+        _wsgi_signins(timings, _signin_users(requests, f"{run_id}w"), workers)
+        asyncio.run(_asgi_signins(timings, _signin_users(requests, f"{run_id}a"), concurrency))
+    return timings
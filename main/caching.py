@@ -0,0 +1,140 @@
+import hashlib
+import time
+from functools import partial, wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
+from django.middleware.csrf import get_token
+from django.utils.cache import patch_vary_headers
+from django.utils.http import urlencode
+
+
+# ------------------ ANONYMOUS PAGE CACHE ------------------
+def _is_anonymous(request):
+    """True when the request carries no authenticated user"""
+    # No session cookie means no login, so skip the session lookup entirely
+    if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+        return True
+    return not request.user.is_authenticated
+
+
+def _page_cache_key(request, query_params):
+    # Only the parameters the page reads: utm_*, gclid and the like would
+    # otherwise add an entry per link shared
+    query = urlencode(sorted(
+        (name, value) for name in query_params for value in request.GET.getlist(name)
+    ))
+    return f"page:{request.path}?{query}"
+
+
+def anonymous_page_cache(view_func=None, *, query_params=()):
+    """Serve a cached copy of the page to anonymous visitors.
+
+    Entries live for ``PAGE_CACHE_TIMEOUT`` seconds and are keyed by the
+    path, the ``query_params`` the page reads and ``PAGE_CACHE_VERSION``, so
+    that a deploy can invalidate them all at once. Logged-in users always get
+    a freshly rendered page.
+    """
+    if view_func is None:
+        return partial(anonymous_page_cache, query_params=query_params)
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        timeout = settings.PAGE_CACHE_TIMEOUT
+        if timeout <= 0 or request.method not in ('GET', 'HEAD') or not _is_anonymous(request):
+            response = view_func(request, *args, **kwargs)
+            patch_vary_headers(response, ('Cookie',))
+            return response
+
+        key = _page_cache_key(request, query_params)
+        version = settings.PAGE_CACHE_VERSION
+        response = cache.get(key, version=version)
+        if response is None:
+            response = view_func(request, *args, **kwargs)
+            # Never share a response that sets cookies (e.g. CSRF) across visitors
+            if response.status_code == 200 and not response.cookies:
+                cache.set(key, response, timeout, version=version)
+        patch_vary_headers(response, ('Cookie',))
+        return response
+
+    return wrapper
+
+
+# ------------------ MODEL VERSION COUNTERS ------------------
+# Dashboard fragments are keyed by a per-model version number that is bumped
+# whenever a row of that model changes, so stale fragments are never served.
+# save() and delete() bump it from the signals in signals.py, and update(),
+# bulk_update() and bulk_create() through VersionedQuerySet; only raw SQL
+# has to call bump_model_version itself.
+VERSIONED_MODELS = {
+    'item': 'main.agricultureitem',
+    'rental': 'main.rentalrequest',
+    'user': 'main.customuser',
+}
+
+
+def _version_key(label):
+    return f"version:{label}"
+
+
+def _initial_version():
+    # Time based so a counter lost to eviction never reuses an old number
+    return int(time.time() * 1000)
+
+
+def model_versions(*labels):
+    """Current version number for each model label"""
+    keys = {label: _version_key(label) for label in labels}
+    found = cache.get_many(keys.values())
+    versions = {}
+    for label, key in keys.items():
+        if key not in found:
+            cache.add(key, _initial_version(), None)
+            found[key] = cache.get(key)
+        versions[label] = found[key]
+    return versions
+
+
+def _bump(label):
+    key = _version_key(label)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _initial_version(), None)
+
+
+def bump_model_version(label):
+    """Invalidate every fragment cached for the given model label once the current transaction commits"""
+    # Bumping earlier would let a page rendered before the commit cache the old
+    # rows under the new version. Runs straight away outside a transaction.
+    transaction.on_commit(partial(_bump, label))
+
+
+class VersionedQuerySet(models.QuerySet):
+    """QuerySet whose bulk writes, which skip the model signals, bump the model version"""
+
+    def _changed(self, count):
+        if count:
+            bump_model_version(self.model._meta.label_lower)
+        return count
+
+    def update(self, **kwargs):
+        # bulk_update() runs through here too, once per batch
+        return self._changed(super().update(**kwargs))
+
+    def bulk_create(self, objs, *args, **kwargs):
+        created = super().bulk_create(objs, *args, **kwargs)
+        self._changed(len(created))
+        return created
+
+
+def fragment_cache_context(request):
+    """Timeout and cache-key parts for the dashboard {% cache %} fragments"""
+    versions = model_versions(*VERSIONED_MODELS.values())
+    context = {name: versions[label] for name, label in VERSIONED_MODELS.items()}
+    context['timeout'] = settings.FRAGMENT_CACHE_TIMEOUT
+    # Fragments holding {% csrf_token %} are only reused within one CSRF secret
+    get_token(request)
+    context['csrf'] = hashlib.md5(request.META['CSRF_COOKIE'].encode()).hexdigest()[:12]
+    return context
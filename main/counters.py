@@ -0,0 +1,80 @@
+"""Rental counters kept on AgricultureItem.
+
+Each item carries rental_count, active_rental_count, advance_revenue and
+damage_count so analytics can read columns instead of counting rentals
+through a join. The post_save/post_delete receivers in signals.py apply
+each rental's change with F() expressions; code that writes rentals with
+update() or raw SQL must call apply_counter_deltas or reconcile_counters.
+Archived rentals (main/archive.py) stay counted.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Count, F, Q, Sum
+
+from .archive import RENTAL_MODELS
+from .models import AgricultureItem, RentalRequest
+
+COUNTER_FIELDS = AgricultureItem.COUNTER_FIELDS
+
+# What a rental's state must be read from to count it
+RENTAL_STATE_FIELDS = ('item_id', 'status', 'advance_paid', 'return_condition', 'advance_amount')
+
+
+def rental_contribution(status, advance_paid, return_condition, advance):
+    """The amounts one rental adds to its item's counters"""
+    return {
+        'rental_count': 1,
+        'active_rental_count': int(status in RentalRequest.ACTIVE_STATUSES),
+        'advance_revenue': advance if advance_paid else Decimal('0'),
+        'damage_count': int(status == 'damaged' or return_condition == 'damaged'),
+    }
+
+
+def contribution_of(rental):
+    return rental_contribution(rental.status, rental.advance_paid, rental.return_condition, rental.advance_amount)
+
+
+def apply_counter_deltas(item_id, deltas, sign=1):
+    """Add ``sign * deltas`` to an item's counters in one UPDATE"""
+    changes = {field: F(field) + sign * delta for field, delta in deltas.items() if delta}
+    if changes:
+        AgricultureItem.objects.filter(pk=item_id).update(**changes)
+
+
+def expected_counters():
+    """Counters recomputed from the live and archived rentals, keyed by item id"""
+    expected = defaultdict(lambda: dict.fromkeys(COUNTER_FIELDS, 0))
+    for model in RENTAL_MODELS:
+        rows = model.objects.order_by().values('item_id').annotate(
+            rental_count=Count('id'),
+            active_rental_count=Count('id', filter=Q(status__in=RentalRequest.ACTIVE_STATUSES)),
+            advance_revenue=Sum('advance_amount', filter=Q(advance_paid=True), default=Decimal('0')),
+            damage_count=Count('id', filter=Q(status='damaged') | Q(return_condition='damaged')),
+        )
+        for row in rows:
+            counters = expected[row.pop('item_id')]
+            for field, value in row.items():
+                counters[field] += value
+    return {item_id: expected[item_id] for item_id in AgricultureItem.objects.values_list('id', flat=True)}
+
+
+def counter_drift():
+    """(item, expected counters) for every item whose stored counters are off"""
+    expected = expected_counters()
+    for item in AgricultureItem.objects.only('id', 'name', *COUNTER_FIELDS).order_by('id').iterator(chunk_size=2000):
+        values = expected[item.id]
+        if any(getattr(item, field) != values[field] for field in COUNTER_FIELDS):
+            yield item, values
+
+
+def reconcile_counters(fix=False, batch_size=1000):
+    """Compare stored counters with the rentals table; with ``fix`` rewrite the drifted ones.
+
+    Returns the list of (item, expected counters) that were off.
+    """
+    drifted = list(counter_drift())
+    if fix and drifted:
+        items = [AgricultureItem(id=item.id, **values) for item, values in drifted]
+        AgricultureItem.objects.bulk_update(items, COUNTER_FIELDS, batch_size=batch_size)
+    return drifted
@@ -0,0 +1,71 @@
+"""Append-only log of rental lifecycle changes.
+
+Views call record_event() as they change a rental, and bulk actions pass
+every change to record_events(), which writes them with one bulk_create:
+a bulk action that moves hundreds of rentals adds one INSERT. Events are
+written inside the caller's transaction, so a rolled back change, or
+savepoint, leaves no event behind.
+
+Rows are never updated or deleted, and carry the rental id rather than a
+foreign key, so archived rentals (main/archive.py) keep their history.
+time_to_status() reads durations such as request to approval from the
+log alone, through its (rental_id, event, created_at) index.
+"""
+import statistics
+
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from .models import RentalEvent
+
+
+# ------------------ RECORDING ------------------
+def new_event(rental_id, event, to_status, from_status='', actor=None, note=''):
+    """An unsaved event for record_events()"""
+    return RentalEvent(
+        rental_id=rental_id, event=event, from_status=from_status or '', to_status=to_status,
+        actor=actor, note=note[:255], created_at=timezone.now(),
+    )
+
+
+def record_event(rental_id, event, to_status, from_status='', actor=None, note=''):
+    """Log one change to a rental"""
+    entry = new_event(rental_id, event, to_status, from_status, actor=actor, note=note)
+    entry.save()
+    return entry
+
+
+def record_events(events, batch_size=1000):
+    """Log many changes, built with new_event(), in one INSERT per ``batch_size``"""
+    return RentalEvent.objects.bulk_create(events, batch_size=batch_size)
+
+
+# ------------------ DURATIONS ------------------
+def time_to_status(status='approved', since=None):
+    """How long rentals took from request to first reaching ``status``, from the event log.
+
+    Covers rentals that reached it at or after ``since``. Returns None when
+    none did, else the count and the average and median in hours.
+    """
+    requested_at = RentalEvent.objects.filter(
+        rental_id=OuterRef('rental_id'), event='requested',
+    ).order_by('created_at').values('created_at')[:1]
+    reached = RentalEvent.objects.filter(to_status=status).exclude(from_status=status)
+    if since is not None:
+        reached = reached.filter(created_at__gte=since)
+    rows = (
+        reached.annotate(requested_at=Subquery(requested_at))
+        .order_by('created_at').values_list('rental_id', 'requested_at', 'created_at')
+    )
+    hours = {}
+    for rental_id, requested, at in rows.iterator(chunk_size=5000):
+        # Only the first time each rental got there; skip rentals with no logged request
+        if requested is not None:
+            hours.setdefault(rental_id, (at - requested).total_seconds() / 3600)
+    if not hours:
+        return None
+    return {
+        'count': len(hours),
+        'average_hours': round(statistics.fmean(hours.values()), 1),
+        'median_hours': round(statistics.median(hours.values()), 1),
+    }
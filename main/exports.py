@@ -0,0 +1,76 @@
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import CustomUser, AgricultureItem, RentalRequest
+from .routers import replica_alias
+
+
+# ------------------ EXPORT DEFINITIONS ------------------
+# Each dataset maps to a model and the values_list() columns to export.
+# Related columns use the ORM's double-underscore joins, so rentals carry
+# their user and item details without per-row queries.
+EXPORTS = {
+    'rentals': (RentalRequest, (
+        'id', 'user__username', 'user__email', 'item__name', 'item__category',
+        'daily_rate', 'advance_amount', 'status', 'request_date', 'terms_accepted',
+        'advance_paid', 'payment_reference', 'is_returned', 'return_date',
+        'return_condition', 'penalty_amount', 'refund_processed',
+        'refund_amount', 'refund_date',
+    )),
+    'users': (CustomUser, (
+        'id', 'username', 'email', 'phone', 'address', 'role', 'status',
+        'is_aadhaar_verified', 'aadhaar_verification_date', 'wallet_balance',
+        'last_login',
+    )),
+    'items': (AgricultureItem, (
+        'id', 'name', 'category', 'price_per_day', 'is_available',
+        'added_by__username', 'created_at', 'updated_at',
+    )),
+}
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to the caller"""
+    def write(self, value):
+        return value
+
+
+def export_rows(dataset, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Stream tuples for a dataset from the replica without loading the table into memory"""
+    model, columns = EXPORTS[dataset]
+    # Bound to an alias here: a streamed response is read after the view has returned
+    return model.objects.using(replica_alias()).order_by('pk').values_list(*columns).iterator(chunk_size=chunk_size)
+
+
+def _csv_lines(columns, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _ndjson_lines(columns, rows):
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    for row in rows:
+        yield encoder.encode(dict(zip(columns, row))) + '\n'
+
+
+def export_lines(dataset, fmt='csv', chunk_size=DEFAULT_CHUNK_SIZE):
+    """Lazily render a dataset as CSV or NDJSON text lines"""
+    if dataset not in EXPORTS:
+        raise ValueError(f"Unknown dataset '{dataset}'")
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown format '{fmt}'")
+    columns = EXPORTS[dataset][1]
+    rows = export_rows(dataset, chunk_size)
+    if fmt == 'csv':
+        return _csv_lines(columns, rows)
+    return _ndjson_lines(columns, rows)
@@ -111,7 +111,7 @@ class OTPVerifyForm(forms.Form):
 class AgricultureItemForm(forms.ModelForm):
     class Meta:
         model = AgricultureItem
-        fields = ['name', 'category', 'description', 'price_per_day', 'image', 'is_available']
+        fields = ['name', 'category', 'description', 'price_per_day', 'image', 'is_available', 'latitude', 'longitude']
         widgets = {
             'name': forms.TextInput(attrs={
                 'class': 'amazon-form-control',
@@ -137,10 +137,25 @@ class AgricultureItemForm(forms.ModelForm):
             'is_available': forms.CheckboxInput(attrs={
                 'class': 'form-check-input'
             }),
+            'latitude': forms.NumberInput(attrs={
+                'class': 'amazon-form-control',
+                'placeholder': 'Depot latitude',
+                'step': 'any',
+                'min': '-90',
+                'max': '90'
+            }),
+            'longitude': forms.NumberInput(attrs={
+                'class': 'amazon-form-control',
+                'placeholder': 'Depot longitude',
+                'step': 'any',
+                'min': '-180',
+                'max': '180'
+            }),
         }
         help_texts = {
             'image': 'Upload a clear image of the item (JPG, PNG, WEBP)',
             'price_per_day': 'Enter the daily rental price in ₹',
+            'latitude': 'Where the item is kept, so farmers can find the nearest one',
         }
 
     def clean_price_per_day(self):
@@ -149,6 +164,15 @@ class AgricultureItemForm(forms.ModelForm):
             raise forms.ValidationError("Price must be greater than 0")
         return price_per_day
 
+    def clean(self):
+        cleaned_data = super().clean()
+        latitude, longitude = cleaned_data.get('latitude'), cleaned_data.get('longitude')
+        if (latitude is None) != (longitude is None):
+            raise forms.ValidationError("Enter both latitude and longitude, or neither")
+        if latitude is not None and not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise forms.ValidationError("Latitude must be within ±90 and longitude within ±180")
+        return cleaned_data
+
     def clean_name(self):
         name = self.cleaned_data.get('name')
         if name and len(name) < 3:
@@ -190,17 +214,14 @@ class RentalStatusForm(forms.ModelForm):
 class RentalManagementForm(forms.ModelForm):
     """
     Admin can update rental details like:
-    - Status (approve/reject/returned/damaged)
     - Damage report
     - Penalty amount
+    Status changes go through main/transitions.py instead.
     """
     class Meta:
         model = RentalRequest
-        fields = ['status', 'damage_report', 'penalty_amount']
+        fields = ['damage_report', 'penalty_amount']
         widgets = {
-            'status': forms.Select(attrs={
-                'class': 'amazon-form-control'
-            }),
             'damage_report': forms.Textarea(attrs={
                 'class': 'amazon-form-control',
                 'rows': 3, 
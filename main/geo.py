@@ -0,0 +1,144 @@
+"""Nearest available equipment without a spatial database.
+
+Items with a location are bucketed into a fixed grid of GEO_CELL_DEGREES
+cells; grid_cell is stored on the row and indexed together with
+is_available. nearest_available_items() reads the origin's cell, then
+rings of cells around it, computes exact haversine distances for the
+candidates (vectorized when numpy is installed) and stops as soon as ``k``
+items are closer than anything an unread ring could hold.
+"""
+import math
+import operator
+from functools import reduce
+
+from django.db.models import Q
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+GEO_CELL_DEGREES = 0.1  # about 11 km north to south
+GRID_COLUMNS = round(360 / GEO_CELL_DEGREES)
+GRID_ROWS = round(180 / GEO_CELL_DEGREES)
+HALF_COLUMNS = GRID_COLUMNS // 2
+EARTH_RADIUS_KM = 6371.0088
+CELL_KM = EARTH_RADIUS_KM * math.radians(GEO_CELL_DEGREES)
+DEFAULT_MAX_KM = 150
+MAX_SEARCH_KM = 500  # keeps the number of cell ranges in one query bounded
+
+
+# ------------------ GRID ------------------
+def _row_col(lat, lng):
+    row = min(int((lat + 90) / GEO_CELL_DEGREES), GRID_ROWS - 1)
+    col = int((lng + 180) / GEO_CELL_DEGREES) % GRID_COLUMNS
+    return row, col
+
+
+def grid_cell(lat, lng):
+    """Grid cell number of a point; None when either coordinate is missing"""
+    if lat is None or lng is None:
+        return None
+    row, col = _row_col(lat, lng)
+    return row * GRID_COLUMNS + col
+
+
+def ring_ranges(row, col, inner, outer, max_rows=None):
+    """Inclusive grid_cell ranges covering the cells whose Chebyshev distance from (row, col) is in (inner, outer].
+
+    Rows more than ``max_rows`` away are left out. Column offsets are clamped
+    to one trip around the globe, so once ``outer`` reaches HALF_COLUMNS the
+    ring's rows are whole grid rows and no cell is covered twice.
+    """
+    row_reach = outer if max_rows is None else min(outer, max_rows)
+    ranges = []
+    for dr in range(-row_reach, row_reach + 1):
+        r = row + dr
+        if not 0 <= r < GRID_ROWS:
+            continue
+        spans = [(-outer, outer)] if abs(dr) > inner else [(-outer, -inner - 1), (inner + 1, outer)]
+        first = r * GRID_COLUMNS
+        for low, high in spans:
+            low, high = max(low, 1 - HALF_COLUMNS), min(high, HALF_COLUMNS)
+            if low > high:
+                continue
+            low, high = (col + low) % GRID_COLUMNS, (col + high) % GRID_COLUMNS
+            if low <= high:
+                ranges.append((first + low, first + high))
+            else:  # wraps around the antimeridian
+                ranges += [(first + low, first + GRID_COLUMNS - 1), (first, first + high)]
+    return ranges
+
+
+def covered_km(lat, radius):
+    """Distance from a point within which every place lies inside ``radius`` rings of its cell"""
+    if radius >= HALF_COLUMNS:
+        return radius * CELL_KM  # whole grid rows; only the north-south reach limits it
+    # A place further east or west is at least this far, at the latitude nearest the pole it can have
+    edge = math.radians(min(abs(lat) + (radius + 1) * GEO_CELL_DEGREES, 90))
+    east_west = 2 * EARTH_RADIUS_KM * math.asin(math.cos(edge) * math.sin(math.radians(radius * GEO_CELL_DEGREES) / 2))
+    return min(radius * CELL_KM, east_west)
+
+
+# ------------------ DISTANCE ------------------
+def haversine_km(lat, lng, lats, lngs):
+    """Great-circle distances in km from one point to each of ``lats``/``lngs``"""
+    if np is None:
+        return [_haversine(lat, lng, other_lat, other_lng) for other_lat, other_lng in zip(lats, lngs)]
+    lat, lng = math.radians(lat), math.radians(lng)
+    lats, lngs = np.radians(np.asarray(lats, dtype=float)), np.radians(np.asarray(lngs, dtype=float))
+    a = np.sin((lats - lat) / 2) ** 2 + math.cos(lat) * np.cos(lats) * np.sin((lngs - lng) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1)))
+
+
+def _haversine(lat, lng, other_lat, other_lng):
+    lat, lng, other_lat, other_lng = map(math.radians, (lat, lng, other_lat, other_lng))
+    a = math.sin((other_lat - lat) / 2) ** 2 + math.cos(lat) * math.cos(other_lat) * math.sin((other_lng - lng) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1)))
+
+
+# ------------------ SEARCH ------------------
+def nearest_available_items(lat, lng, k=10, category=None, max_km=DEFAULT_MAX_KM):
+    """Up to ``k`` available items within ``max_km`` of a point, nearest first.
+
+    Each item gets a ``distance_km`` attribute. ``max_km`` is capped at MAX_SEARCH_KM.
+    """
+    # Import here to avoid circular imports
+    from .models import AgricultureItem
+
+    items = AgricultureItem.objects.filter(is_available=True)
+    if category:
+        items = items.filter(category=category)
+    max_km = min(max_km, MAX_SEARCH_KM)
+    row, col = _row_col(lat, lng)
+    # Rows further than this are more than max_km away north or south
+    max_rows = math.ceil(max_km / CELL_KM) + 1
+
+    ids, lats, lngs = [], [], []
+    distances = []
+    inner, radius = -1, 0
+    while True:
+        # One range per grid row keeps each query on the (grid_cell, is_available) index
+        band = reduce(operator.or_, (Q(grid_cell__range=cells) for cells in ring_ranges(row, col, inner, radius, max_rows)), Q(pk__in=[]))
+        for item_id, item_lat, item_lng in items.filter(band).values_list('id', 'latitude', 'longitude'):
+            ids.append(item_id)
+            lats.append(item_lat)
+            lngs.append(item_lng)
+        distances = haversine_km(lat, lng, lats, lngs)
+        reach = min(covered_km(lat, radius), max_km)
+        # At HALF_COLUMNS the rings are whole rows, so every place within max_km has been read
+        if sum(1 for distance in distances if distance <= reach) >= k or reach >= max_km or radius >= HALF_COLUMNS:
+            break
+        # Widen geometrically so sparse areas take a handful of queries
+        inner, radius = radius, min(max(radius * 2, 1), HALF_COLUMNS)
+
+    nearest = sorted(
+        (float(distance), item_id) for distance, item_id in zip(distances, ids) if distance <= max_km
+    )[:k]
+    found = AgricultureItem.objects.in_bulk([item_id for _, item_id in nearest])
+    results = []
+    for distance, item_id in nearest:
+        item = found[item_id]
+        item.distance_km = round(distance, 1)
+        results.append(item)
+    return results
@@ -0,0 +1,51 @@
+"""Non-blocking mail sending for the async views.
+
+With the SMTP backend and aiosmtplib installed, messages go out over an
+asyncio SMTP connection, so a waiting view costs no worker thread. A mail
+backend may also provide its own ``asend_messages`` coroutine. Anything
+else falls back to the backend's blocking ``send_messages`` in a thread.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.core.mail.backends.smtp import EmailBackend as SMTPBackend
+
+from . import metrics
+
+try:
+    import aiosmtplib
+except ImportError:  # pragma: no cover - optional dependency
+    aiosmtplib = None
+
+
+async def _smtp_send(message):
+    await aiosmtplib.send(
+        message.message(),
+        sender=message.from_email,
+        recipients=message.recipients(),
+        hostname=settings.EMAIL_HOST,
+        port=settings.EMAIL_PORT,
+        username=settings.EMAIL_HOST_USER or None,
+        password=settings.EMAIL_HOST_PASSWORD or None,
+        start_tls=settings.EMAIL_USE_TLS,
+        use_tls=settings.EMAIL_USE_SSL,
+        timeout=settings.EMAIL_TIMEOUT,
+    )
+
+
+async def asend_message(message):
+    """Send one EmailMessage without blocking the event loop"""
+    with metrics.track('send_mail'):
+        backend = get_connection()
+        if hasattr(backend, 'asend_messages'):
+            await backend.asend_messages([message])
+        elif aiosmtplib is not None and type(backend) is SMTPBackend:
+            await _smtp_send(message)
+        else:
+            # Not thread sensitive: slow SMTP must not hold up the ORM thread
+            await sync_to_async(backend.send_messages, thread_sensitive=False)([message])
+
+
+async def asend_mail(subject, message, recipient_list, from_email=None):
+    """Async counterpart of django.core.mail.send_mail"""
+    await asend_message(EmailMessage(subject, message, from_email, recipient_list))
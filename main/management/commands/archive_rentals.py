@@ -0,0 +1,26 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from main.archive import archivable_rentals, archive_rentals
+
+
+class Command(BaseCommand):
+    help = "Move closed rentals settled more than --days ago from RentalRequest into the archive table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.RENTAL_ARCHIVE_AFTER_DAYS)
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rentals moved per transaction")
+        parser.add_argument('--limit', type=int, help="Stop after this many rentals")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the rentals that would move")
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            count = archivable_rentals(options['days']).count()
+            self.stdout.write(f"{count} rentals closed more than {options['days']} days ago would be archived")
+            return
+
+        started = time.perf_counter()
+        moved = sum(archive_rentals(options['days'], options['batch_size'], options['limit']))
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} rentals in {time.perf_counter() - started:.1f}s"))
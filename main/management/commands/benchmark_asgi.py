@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from main.benchmarks import run_signin_concurrency_benchmark, throwaway_database
+
+
+class Command(BaseCommand):
+    help = "Compare WSGI worker threads with an ASGI event loop on the OTP signin view, whose mail is made slow on purpose"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Signins per server model")
+        parser.add_argument('--workers', type=int, default=8, help="WSGI worker threads")
+        parser.add_argument('--concurrency', type=int, default=200, help="ASGI requests in flight")
+        parser.add_argument('--mail-latency', type=float, default=0.2, help="Seconds the SMTP server takes per mail")
+
+    def handle(self, *args, **options):
+        with throwaway_database():
+            timings = run_signin_concurrency_benchmark(
+                options['requests'], options['workers'], options['concurrency'], options['mail_latency'],
+            )
+
+        self.stdout.write(
+            f"{options['requests']} signins, {options['workers']} WSGI threads, "
+            f"ASGI concurrency {options['concurrency']}, mail latency {options['mail_latency']}s"
+        )
+        self.stdout.write(f"{'server':<8} {'count':>6} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9}")
+        for row in timings.report(steps=('wsgi', 'asgi')):
+            if not row['count']:
+                self.stdout.write(f"{row['step']:<8} {0:>6} {row['errors']:>6}")
+                continue
+            self.stdout.write(
+                f"{row['step']:<8} {row['count']:>6} {row['errors']:>6} {row['p50_ms']:>9.1f} "
+                f"{row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f} {row['rps']:>9.1f}"
+            )
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from main.benchmarks import run_lifecycle_benchmark, throwaway_database
+
+
+class Command(BaseCommand):
+    help = "Benchmark the rental lifecycle (signup to refund) with concurrent simulated farmers on a throwaway database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50, help="Simulated farmers")
+        parser.add_argument('--concurrency', type=int, default=8, help="Farmers running at the same time")
+
+    def handle(self, *args, **options):
+        with throwaway_database():
+            timings, failures = run_lifecycle_benchmark(options['users'], options['concurrency'])
+
+        self.stdout.write(f"{options['users']} farmers, concurrency {options['concurrency']}")
+        self.stdout.write(f"{'step':<22} {'count':>6} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9}")
+        for row in timings.report():
+            if not row['count']:
+                self.stdout.write(f"{row['step']:<22} {0:>6} {row['errors']:>6}")
+                continue
+            self.stdout.write(
+                f"{row['step']:<22} {row['count']:>6} {row['errors']:>6} {row['p50_ms']:>9.1f} "
+                f"{row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f} {row['rps']:>9.1f}"
+            )
+        for failure in failures[:10]:
+            self.stderr.write(failure)
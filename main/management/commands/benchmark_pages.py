@@ -0,0 +1,40 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment
+from django.urls import reverse
+
+
+class Command(BaseCommand):
+    help = "Measure requests per second for the landing/about/contact pages with and without the page cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help="Requests per route and mode")
+        parser.add_argument('--routes', nargs='+', default=['landing', 'about', 'contact'])
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        client = Client()
+        count = options['requests']
+
+        self.stdout.write(f"{'route':<10} {'uncached rps':>14} {'cached rps':>12} {'speedup':>9}")
+        for name in options['routes']:
+            url = reverse(name)
+            with override_settings(PAGE_CACHE_TIMEOUT=0):
+                uncached = self._requests_per_second(client, url, count)
+            # A version of its own starts the page cache cold without touching
+            # the other entries (OTPs, throttles, fragment versions) in the cache
+            with override_settings(PAGE_CACHE_VERSION=f"benchmark-{uuid.uuid4().hex}"):
+                client.get(url)  # warm the cache
+                cached = self._requests_per_second(client, url, count)
+            self.stdout.write(f"{name:<10} {uncached:>14.1f} {cached:>12.1f} {cached / uncached:>8.1f}x")
+
+    def _requests_per_second(self, client, url, count):
+        start = time.perf_counter()
+        for _ in range(count):
+            response = client.get(url)
+            if response.status_code != 200:
+                raise CommandError(f"{url} returned {response.status_code}")
+        return count / (time.perf_counter() - start)
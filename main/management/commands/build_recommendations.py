@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.recommendations import DEFAULT_TOP_K, build_recommendations
+
+
+class Command(BaseCommand):
+    help = "Rebuild the 'farmers who rented this also rented' table from rental history (needs numpy and scipy)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K, help="Neighbours kept per item")
+
+    def handle(self, *args, **options):
+        if options['top_k'] < 1:
+            raise CommandError("--top-k must be positive")
+        started = time.perf_counter()
+        try:
+            written = build_recommendations(options['top_k'])
+        except ImportError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f"Stored {written} recommendations in {time.perf_counter() - started:.1f}s"))
@@ -0,0 +1,297 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max, Sum
+from django.utils import timezone
+
+from main.caching import bump_model_version
+from main.counters import reconcile_counters
+from main.geo import grid_cell
+from main.models import CustomUser, AgricultureItem, RentalRequest, StockNotification
+
+# Relative share of each rental status in the generated history
+STATUS_WEIGHTS = {
+    'returned': 55,
+    'rejected': 12,
+    'damaged': 8,
+    'approved': 15,
+    'pending': 10,
+}
+
+# Implements of the same category share a plausible price band (₹/day)
+CATEGORY_PRICES = {
+    'Lawn & Gardening': (150, 600),
+    'Hand Tools': (50, 250),
+    'Earth Auger': (400, 1200),
+    'Ploughs': (600, 2500),
+    'Seeders': (800, 3000),
+    'Sprayers': (200, 900),
+    'Fertilizers': (300, 1500),
+}
+
+CONDITIONS = ('excellent', 'good')
+
+# Farms and depots are placed inside India's bounding box (lat, lng)
+LOCATION_BOUNDS = ((8.0, 35.0), (68.0, 97.0))
+
+
+# Columns written by the raw rental insert, in tuple order
+RENTAL_COLUMNS = (
+    'user_id', 'item_id', 'request_date', 'status', 'daily_rate', 'advance_amount',
+    'approved_at', 'terms_accepted', 'advance_paid', 'is_returned', 'return_date', 'return_condition',
+    'damage_report', 'penalty_amount', 'refund_processed', 'refund_amount',
+    'refund_date', 'deadline_notification_sent',
+)
+
+
+def insert_rows(model, columns, rows):
+    """INSERT plain tuples with executemany.
+
+    Much faster than bulk_create for millions of rows: no model instances,
+    no per-value field preparation, and no small SQLite parameter batches.
+    Values must already be adapted for the database.
+    """
+    quote = connection.ops.quote_name
+    sql = "INSERT INTO {} ({}) VALUES ({})".format(
+        quote(model._meta.db_table),
+        ", ".join(quote(column) for column in columns),
+        ", ".join(["%s"] * len(columns)),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+    bump_model_version(model._meta.label_lower)
+
+
+@contextmanager
+def manual_timestamps(model, *field_names):
+    """Let bulk_create keep explicit values for auto_now/auto_now_add fields"""
+    fields = [model._meta.get_field(name) for name in field_names]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = "Bulk-generate deterministic synthetic users, items, rentals, stock notifications and refunds"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--items', type=int, default=200)
+        parser.add_argument('--rentals', type=int, default=10000)
+        parser.add_argument('--notifications', type=int, default=500)
+        parser.add_argument('--days', type=int, default=730, help="Length of the generated rental history")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        # Locations draw from their own stream so other generated values stay as before
+        self.location_rng = random.Random(f"{options['seed']}-locations")
+        self.batch_size = options['batch_size']
+        self.prefix = f"synth{options['seed']}_"
+        if CustomUser.objects.filter(username__startswith=self.prefix).exists():
+            raise CommandError(f"Data for seed {options['seed']} already exists; use another --seed")
+
+        self.now = timezone.now()
+        started = time.perf_counter()
+        with transaction.atomic():
+            admin = self.get_admin()
+            user_ids = self.create_users(options['users'])
+            items = self.create_items(options['items'], admin, options['days'])
+            busy_item_ids = self.create_rentals(options['rentals'], user_ids, items, options['days'])
+            AgricultureItem.objects.filter(id__in=busy_item_ids).update(is_available=False, updated_at=self.now)
+            self.create_notifications(options['notifications'], user_ids, sorted(busy_item_ids))
+            self.credit_wallets()
+            # The raw rental insert bypasses the signals that keep item counters
+            reconcile_counters(fix=True, batch_size=self.batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Done in {time.perf_counter() - started:.1f}s"))
+
+    # ---------- Helpers ----------
+    def get_admin(self):
+        admin = CustomUser.objects.filter(role='admin').first()
+        if admin is None:
+            admin = CustomUser.objects.create_superuser('admin', 'admin@agrirentx.com', status='approved')
+        return admin
+
+    def batches(self, objects):
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def location(self):
+        """Random latitude and longitude keyword arguments"""
+        (lat_low, lat_high), (lng_low, lng_high) = LOCATION_BOUNDS
+        return {
+            'latitude': round(self.location_rng.uniform(lat_low, lat_high), 6),
+            'longitude': round(self.location_rng.uniform(lng_low, lng_high), 6),
+        }
+
+    def day_weights(self, days):
+        """Rental demand per day: peaks at kharif and rabi sowing, growing over time"""
+        weights = []
+        for offset in range(days):
+            day = (self.now - timedelta(days=offset)).date()
+            weight = 1.0 + 0.5 * (days - offset) / days
+            if date(day.year, 6, 1) <= day <= date(day.year, 7, 31):
+                weight += 1.5
+            elif date(day.year, 10, 15) <= day <= date(day.year, 11, 30):
+                weight += 1.0
+            weights.append(weight)
+        return weights
+
+    # ---------- Generators ----------
+    def create_users(self, count):
+        password = make_password(None)
+        users = (
+            CustomUser(
+                username=f"{self.prefix}{i}",
+                email=f"{self.prefix}{i}@example.com",
+                password=password,
+                phone=f"9{self.rng.randrange(10 ** 9):09d}",
+                address=f"Plot {self.rng.randint(1, 400)}, Village {self.rng.randint(1, 2000)}",
+                role='user',
+                status='approved',
+                is_aadhaar_verified=self.rng.random() < 0.85,
+                aadhaar_number=f"{self.rng.randrange(10 ** 12):012d}",
+                **self.location(),
+            )
+            for i in range(count)
+        )
+        for batch in self.batches(users):
+            CustomUser.objects.bulk_create(batch)
+        self.stdout.write(f"Created {count} users")
+        return list(CustomUser.objects.filter(username__startswith=self.prefix).values_list('id', flat=True))
+
+    def create_items(self, count, admin, days):
+        categories = [choice for choice, _ in AgricultureItem.CATEGORY_CHOICES]
+        items = []
+        for i in range(count):
+            category = categories[i % len(categories)]
+            low, high = CATEGORY_PRICES.get(category, (100, 1000))
+            created_at = self.now - timedelta(days=days + self.rng.randint(0, 60))
+            location = self.location()
+            items.append(AgricultureItem(
+                name=f"{category} #{i}",
+                category=category,
+                description=f"Synthetic {category.lower()} implement for scale testing",
+                price_per_day=Decimal(self.rng.randrange(low, high, 10)),
+                added_by=admin,
+                created_at=created_at,
+                updated_at=created_at,
+                is_new=False,
+                grid_cell=grid_cell(location['latitude'], location['longitude']),  # bulk_create skips save()
+                **location,
+            ))
+        last_id = AgricultureItem.objects.aggregate(last=Max('id'))['last'] or 0
+        with manual_timestamps(AgricultureItem, 'created_at', 'updated_at'):
+            AgricultureItem.objects.bulk_create(items, batch_size=self.batch_size)
+        self.stdout.write(f"Created {count} items")
+        return list(AgricultureItem.objects.filter(id__gt=last_id).values_list('id', 'price_per_day'))
+
+    def create_rentals(self, count, user_ids, items, days):
+        """Bulk insert rentals; returns ids of items left with an open rental"""
+        rng = self.rng
+        adapt_datetime = connection.ops.adapt_datetimefield_value
+        statuses = list(STATUS_WEIGHTS)
+        # Cumulative weights make each weighted draw a bisect instead of a scan
+        status_cum = list(accumulate(STATUS_WEIGHTS.values()))
+        day_cum = list(accumulate(self.day_weights(days)))
+        day_offsets = range(days)
+        half, cent = Decimal('0.5'), Decimal('0.01')
+        advances = {item_id: (price * half).quantize(cent) for item_id, price in items}
+        busy_item_ids = set()
+
+        def rows():
+            for _ in range(count):
+                item_id, price = rng.choice(items)
+                status = rng.choices(statuses, cum_weights=status_cum)[0]
+                if status in ('pending', 'approved') and item_id in busy_item_ids:
+                    # An implement has at most one open rental; older ones were returned
+                    status = 'returned'
+                if status in ('pending', 'approved'):
+                    # Open rentals are recent
+                    requested = self.now - timedelta(days=rng.randint(0, 6), seconds=rng.randint(0, 86399))
+                    busy_item_ids.add(item_id)
+                else:
+                    # Closed early enough that return and refund dates are in the past
+                    offset = rng.choices(day_offsets, cum_weights=day_cum)[0]
+                    requested = self.now - timedelta(days=offset + 14, seconds=rng.randint(0, 86399))
+                advance_paid = status != 'rejected' and not (status == 'pending' and rng.random() < 0.5)
+                approved = None
+                if status not in ('pending', 'rejected'):
+                    # Approved within two days of the request, never in the future
+                    approved = adapt_datetime(min(requested + timedelta(hours=rng.randint(1, 47)), self.now))
+
+                advance = advances[item_id]
+                returned = None
+                condition = penalty = damage_report = refund = refund_date = None
+                refund_processed = False
+                if status in ('returned', 'damaged'):
+                    # At least two days after the request, so after the approval
+                    returned = requested + timedelta(days=rng.randint(2, 10), hours=rng.randint(0, 23))
+                    if status == 'damaged':
+                        condition = 'damaged'
+                        penalty = (advance * rng.choice((1, 2, 3)) / 10).quantize(cent)
+                        damage_report = "Synthetic damage report"
+                    else:
+                        condition = rng.choice(CONDITIONS)
+                    refund = max(advance * half - (penalty or 0), Decimal('0')).quantize(cent)
+                    if refund > 0 and rng.random() < 0.9:
+                        refund_processed = True
+                        refund_date = adapt_datetime(returned + timedelta(days=rng.randint(0, 3)))
+                    returned = adapt_datetime(returned)
+
+                yield (
+                    rng.choice(user_ids), item_id, adapt_datetime(requested), status, price, advance, approved, True,
+                    advance_paid, returned is not None, returned, condition, damage_report,
+                    penalty, refund_processed, refund, refund_date, False,
+                )
+
+        created = 0
+        for batch in self.batches(rows()):
+            insert_rows(RentalRequest, RENTAL_COLUMNS, batch)
+            created += len(batch)
+            if created % (self.batch_size * 20) == 0:
+                self.stdout.write(f"  {created} rentals...")
+        self.stdout.write(f"Created {created} rentals")
+        return busy_item_ids
+
+    def create_notifications(self, count, user_ids, item_ids):
+        if not item_ids or not user_ids:
+            return
+        count = min(count, len(user_ids) * len(item_ids))
+        pairs = set()
+        while len(pairs) < count:
+            pairs.add((self.rng.choice(user_ids), self.rng.choice(item_ids)))
+        StockNotification.objects.bulk_create(
+            [StockNotification(user_id=user_id, item_id=item_id) for user_id, item_id in sorted(pairs)],
+            batch_size=self.batch_size,
+        )
+        self.stdout.write(f"Created {count} stock notifications")
+
+    def credit_wallets(self):
+        """Credit each user's wallet with the refunds generated for them"""
+        refunds = (
+            RentalRequest.objects.filter(user__username__startswith=self.prefix, refund_processed=True)
+            .values('user_id').annotate(total=Sum('refund_amount'))
+        )
+        users = [CustomUser(id=row['user_id'], wallet_balance=row['total']) for row in refunds]
+        CustomUser.objects.bulk_update(users, ['wallet_balance'], batch_size=self.batch_size)
+        self.stdout.write(f"Credited refunds to {len(users)} wallets")
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from main.counters import COUNTER_FIELDS, reconcile_counters
+
+
+class Command(BaseCommand):
+    help = "Check the per-item rental counters against the rentals table and optionally repair them"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Rewrite counters that have drifted")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        drifted = reconcile_counters(fix=options['fix'], batch_size=options['batch_size'])
+        for item, expected in drifted[:50]:
+            changes = ", ".join(
+                f"{field} {getattr(item, field)} -> {expected[field]}"
+                for field in COUNTER_FIELDS if getattr(item, field) != expected[field]
+            )
+            self.stdout.write(f"#{item.id} {item.name}: {changes}")
+        if len(drifted) > 50:
+            self.stdout.write(f"... and {len(drifted) - 50} more")
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS("All item counters match"))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f"Repaired counters on {len(drifted)} items"))
+        else:
+            self.stdout.write(self.style.WARNING(f"{len(drifted)} items have drifted; rerun with --fix to repair"))
@@ -0,0 +1,55 @@
+import csv
+import sys
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.reconciliation import PaymentIndex, StatementError, mark_verified, reconcile_statement
+
+
+class Command(BaseCommand):
+    help = "Match a bank/UPI statement CSV against rental advances and mark the matched rentals as verified"
+
+    def add_arguments(self, parser):
+        parser.add_argument('statement', help="Statement CSV file, or - for stdin")
+        parser.add_argument('--window-hours', type=float, default=48, help="How far a credit may be from the payment time")
+        parser.add_argument('--unmatched', help="Write unmatched credits with the reason to this CSV file")
+        parser.add_argument('--encoding', default='utf-8-sig')
+        parser.add_argument('--dry-run', action='store_true', help="Report matches without marking rentals")
+
+    def handle(self, *args, **options):
+        if options['window_hours'] <= 0:
+            raise CommandError("--window-hours must be positive")
+        started = time.perf_counter()
+        index = PaymentIndex.awaiting_verification(timedelta(hours=options['window_hours']))
+        self.stdout.write(f"{len(index.advances)} rentals awaiting verification")
+
+        try:
+            if options['statement'] == '-':
+                counts, unmatched = reconcile_statement(sys.stdin, index)
+            else:
+                with open(options['statement'], newline='', encoding=options['encoding']) as statement:
+                    counts, unmatched = reconcile_statement(statement, index)
+        except (OSError, StatementError) as e:
+            raise CommandError(str(e))
+
+        for outcome, count in sorted(counts.items()):
+            self.stdout.write(f"{outcome:<26} {count:>8}")
+        for line, row, reason in unmatched[:20]:
+            self.stdout.write(f"  line {line}: {reason} ({', '.join(row)})")
+        if len(unmatched) > 20:
+            self.stdout.write(f"  ... and {len(unmatched) - 20} more")
+        if options['unmatched']:
+            with open(options['unmatched'], 'w', newline='', encoding='utf-8') as out:
+                writer = csv.writer(out)
+                writer.writerow(['line', 'reason', 'row'])
+                writer.writerows([line, reason, *row] for line, row, reason in unmatched)
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f"Dry run: {len(index.matched)} rentals would be marked verified"))
+            return
+        verified = mark_verified(index.matched)
+        self.stdout.write(self.style.SUCCESS(
+            f"Marked {verified} rentals verified in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,94 @@
+"""Prometheus metrics for views, outgoing mail, invoice PDFs and DB usage.
+
+prometheus_client is optional; without it every helper here is a no-op and
+/metrics answers 503. To aggregate across gunicorn workers, point the
+PROMETHEUS_MULTIPROC_DIR environment variable at an empty directory before
+the workers start: each process then writes its samples to mmap-backed files
+there and a single scrape of any worker reports the whole node. Call
+``prometheus_client.multiprocess.mark_process_dead(worker.pid)`` from
+gunicorn's ``child_exit`` hook so dead workers' gauges are dropped.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.http import HttpResponse
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:  # pragma: no cover - optional dependency
+    prometheus_client = None
+
+
+if prometheus_client is not None:
+    REQUEST_LATENCY = prometheus_client.Histogram(
+        'agrirentx_request_duration_seconds',
+        'Request latency by URL name',
+        ['url_name', 'method'],
+        buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    )
+    DB_QUERIES = prometheus_client.Counter(
+        'agrirentx_db_queries_total',
+        'SQL statements executed, by URL name',
+        ['url_name'],
+    )
+    DB_QUERY_SECONDS = prometheus_client.Counter(
+        'agrirentx_db_query_seconds_total',
+        'Time spent in SQL statements, by URL name',
+        ['url_name'],
+    )
+    OPERATION_LATENCY = prometheus_client.Histogram(
+        'agrirentx_operation_duration_seconds',
+        'Duration of slow side operations (send_mail, invoice_pdf, stock_notification_fanout)',
+        ['operation'],
+        buckets=(0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+    )
+    OPERATION_FAILURES = prometheus_client.Counter(
+        'agrirentx_operation_failures_total',
+        'Side operations that raised',
+        ['operation'],
+    )
+
+
+# ------------------ RECORDING ------------------
+@contextmanager
+def track(operation):
+    """Time a block of work such as a send_mail call or a PDF render"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        if prometheus_client is not None:
+            OPERATION_FAILURES.labels(operation).inc()
+        raise
+    finally:
+        if prometheus_client is not None:
+            OPERATION_LATENCY.labels(operation).observe(time.perf_counter() - start)
+
+
+def observe_request(url_name, method, stats):
+    """Record a finished request from the PerformanceMiddleware stats"""
+    if prometheus_client is None:
+        return
+    url_name = url_name or 'unresolved'
+    REQUEST_LATENCY.labels(url_name, method).observe(stats.wall_ms / 1000)
+    DB_QUERIES.labels(url_name).inc(len(stats.queries))
+    DB_QUERY_SECONDS.labels(url_name).inc(stats.db_ms / 1000)
+
+
+# ------------------ SCRAPE ENDPOINT ------------------
+def metrics_view(request):
+    """Expose all metrics in the Prometheus text format"""
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponse("Forbidden", status=403, content_type='text/plain')
+    if prometheus_client is None:
+        return HttpResponse("prometheus_client is not installed", status=503, content_type='text/plain')
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return HttpResponse(prometheus_client.generate_latest(registry), content_type=prometheus_client.CONTENT_TYPE_LATEST)
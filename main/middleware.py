@@ -0,0 +1,159 @@
+import logging
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.template.base import Template
+
+from . import metrics
+
+logger = logging.getLogger('main.performance')
+
+_current_stats = ContextVar('request_stats', default=None)
+
+
+# ------------------ REQUEST STATS ------------------
+class RequestStats:
+    """Timings collected while one request is being served"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.wall_ms = 0.0
+        self.queries = []  # (sql, duration_ms)
+        self.template_ms = 0.0
+        self.template_depth = 0
+        self.response_bytes = None
+
+    @property
+    def db_ms(self):
+        return sum(duration for _, duration in self.queries)
+
+    def top_queries(self, limit=5):
+        """Slowest SQL statements, identical statements grouped together"""
+        grouped = defaultdict(lambda: [0, 0.0])
+        for sql, duration in self.queries:
+            grouped[sql][0] += 1
+            grouped[sql][1] += duration
+        ranked = sorted(grouped.items(), key=lambda entry: entry[1][1], reverse=True)
+        return [(sql, count, total) for sql, (count, total) in ranked[:limit]]
+
+    def server_timing(self):
+        return ", ".join([
+            f"total;dur={self.wall_ms:.1f}",
+            f'db;dur={self.db_ms:.1f};desc="{len(self.queries)} queries"',
+            f"tpl;dur={self.template_ms:.1f}",
+        ])
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _current_stats.get()
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if stats is not None:
+            stats.queries.append((sql, (time.perf_counter() - start) * 1000))
+
+
+def watch_connections():
+    """Hook _record_query into this thread's connections, once per connection.
+
+    The hook stays installed: it does nothing outside a request and it
+    looks the current request up itself, so requests whose async ORM calls
+    share a worker thread are not counted twice.
+    """
+    for connection in connections.all():
+        if _record_query not in connection.execute_wrappers:
+            connection.execute_wrappers.append(_record_query)
+
+
+_original_template_render = Template.render
+
+
+def _timed_template_render(self, context):
+    stats = _current_stats.get()
+    if stats is None:
+        return _original_template_render(self, context)
+    # Only time the outermost template; {% include %} renders nest inside it
+    stats.template_depth += 1
+    start = time.perf_counter()
+    try:
+        return _original_template_render(self, context)
+    finally:
+        stats.template_depth -= 1
+        if stats.template_depth == 0:
+            stats.template_ms += (time.perf_counter() - start) * 1000
+
+
+def time_templates():
+    """Route Template.render through _timed_template_render; called once from MainConfig.ready()"""
+    if Template.render is not _timed_template_render:
+        Template.render = _timed_template_render
+
+
+# ------------------ MIDDLEWARE ------------------
+class PerformanceMiddleware:
+    """Record wall, DB and template time per view and flag slow requests.
+
+    Adds a Server-Timing header for browser devtools and logs requests
+    slower than SLOW_REQUEST_THRESHOLD_MS with their heaviest SQL.
+    Runs natively under both WSGI and ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current_stats.set(stats)
+        try:
+            watch_connections()
+            response = self.get_response(request)
+        finally:
+            _current_stats.reset(token)
+        return self.finish(request, response, stats)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current_stats.set(stats)
+        try:
+            # Connections are per thread and the async ORM runs its queries on
+            # a sync worker thread, so hook the connections of that thread
+            await sync_to_async(watch_connections)()
+            response = await self.get_response(request)
+        finally:
+            _current_stats.reset(token)
+        return self.finish(request, response, stats)
+
+    def finish(self, request, response, stats):
+        stats.wall_ms = (time.perf_counter() - stats.started) * 1000
+        if not response.streaming:
+            stats.response_bytes = len(response.content)
+        request.performance_stats = stats
+        response['Server-Timing'] = stats.server_timing()
+
+        url_name = request.resolver_match.url_name if request.resolver_match else None
+        metrics.observe_request(url_name, request.method, stats)
+        summary = (
+            f"{request.method} {request.path} ({url_name}): "
+            f"{stats.wall_ms:.0f}ms total, {len(stats.queries)} queries in {stats.db_ms:.0f}ms, "
+            f"templates {stats.template_ms:.0f}ms, {stats.response_bytes or '-'} bytes"
+        )
+        if stats.wall_ms >= settings.SLOW_REQUEST_THRESHOLD_MS:
+            lines = [f"Slow request {summary}"]
+            for sql, count, total in stats.top_queries():
+                lines.append(f"  {total:.1f}ms x{count}: {sql}")
+            logger.warning("\n".join(lines))
+        else:
+            logger.debug(summary)
+        return response
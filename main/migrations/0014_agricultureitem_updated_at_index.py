@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_rentalrequest_deadline_notification_sent_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='agricultureitem',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:56
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_counters(apps, schema_editor):
+    AgricultureItem = apps.get_model('main', 'AgricultureItem')
+    RentalRequest = apps.get_model('main', 'RentalRequest')
+    rows = RentalRequest.objects.order_by().values('item_id').annotate(
+        rental_count=Count('id'),
+        active_rental_count=Count('id', filter=Q(status__in=('pending', 'approved'))),
+        paid=Count('id', filter=Q(advance_paid=True)),
+        damage_count=Count('id', filter=Q(status='damaged') | Q(return_condition='damaged')),
+    )
+    prices = dict(AgricultureItem.objects.values_list('id', 'price_per_day'))
+    items = []
+    for row in rows:
+        advance = (prices[row['item_id']] * Decimal('0.5')).quantize(Decimal('0.01'))
+        items.append(AgricultureItem(
+            id=row['item_id'],
+            rental_count=row['rental_count'],
+            active_rental_count=row['active_rental_count'],
+            advance_revenue=row['paid'] * advance,
+            damage_count=row['damage_count'],
+        ))
+    AgricultureItem.objects.bulk_update(
+        items, ['rental_count', 'active_rental_count', 'advance_revenue', 'damage_count'], batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_agricultureitem_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agricultureitem',
+            name='active_rental_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='agricultureitem',
+            name='advance_revenue',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='agricultureitem',
+            name='damage_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='agricultureitem',
+            name='rental_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
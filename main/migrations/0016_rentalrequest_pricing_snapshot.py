@@ -0,0 +1,45 @@
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def backfill_pricing(apps, schema_editor):
+    """Existing rentals take their item's current price, the best record available"""
+    AgricultureItem = apps.get_model('main', 'AgricultureItem')
+    RentalRequest = apps.get_model('main', 'RentalRequest')
+    for item_id, price in AgricultureItem.objects.values_list('id', 'price_per_day').iterator():
+        RentalRequest.objects.filter(item_id=item_id).update(
+            daily_rate=price,
+            advance_amount=(price * Decimal('0.5')).quantize(Decimal('0.01')),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0015_agricultureitem_rental_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rentalrequest',
+            name='daily_rate',
+            field=models.DecimalField(decimal_places=2, max_digits=8, null=True),
+        ),
+        migrations.AddField(
+            model_name='rentalrequest',
+            name='advance_amount',
+            field=models.DecimalField(decimal_places=2, max_digits=8, null=True),
+        ),
+        migrations.RunPython(backfill_pricing, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='rentalrequest',
+            name='daily_rate',
+            field=models.DecimalField(decimal_places=2, max_digits=8),
+        ),
+        migrations.AlterField(
+            model_name='rentalrequest',
+            name='advance_amount',
+            field=models.DecimalField(decimal_places=2, max_digits=8),
+        ),
+    ]
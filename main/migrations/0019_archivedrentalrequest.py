@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0018_item_and_user_location'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedRentalRequest',
+            fields=[
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected'), ('returned', 'Returned'), ('damaged', 'Damaged')], default='pending', max_length=10)),
+                ('daily_rate', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('advance_amount', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('terms_accepted', models.BooleanField(default=False)),
+                ('advance_paid', models.BooleanField(default=False)),
+                ('payment_reference', models.CharField(blank=True, max_length=100, null=True)),
+                ('damage_report', models.TextField(blank=True, null=True)),
+                ('penalty_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True)),
+                ('return_date', models.DateTimeField(blank=True, null=True)),
+                ('is_returned', models.BooleanField(default=False)),
+                ('return_condition', models.CharField(blank=True, choices=[('excellent', 'Excellent'), ('good', 'Good'), ('damaged', 'Damaged')], max_length=20, null=True)),
+                ('return_notes', models.TextField(blank=True, null=True)),
+                ('admin_return_notes', models.TextField(blank=True, null=True)),
+                ('refund_processed', models.BooleanField(default=False)),
+                ('refund_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True)),
+                ('refund_date', models.DateTimeField(blank=True, null=True)),
+                ('deadline_notification_sent', models.BooleanField(default=False)),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('request_date', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main.agricultureitem')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_rentals', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-request_date'],
+                'abstract': False,
+            },
+        ),
+    ]
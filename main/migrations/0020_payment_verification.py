@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0019_archivedrentalrequest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedrentalrequest',
+            name='paid_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='archivedrentalrequest',
+            name='payment_verified_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='rentalrequest',
+            name='paid_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='rentalrequest',
+            name='payment_verified_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:27
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_requests(apps, schema_editor):
+    """Log when each existing rental was requested, so approvals from now on can be timed"""
+    RentalEvent = apps.get_model('main', 'RentalEvent')
+    for name in ('RentalRequest', 'ArchivedRentalRequest'):
+        rentals = apps.get_model('main', name).objects.order_by().values_list('id', 'user_id', 'request_date')
+        events = []
+        for rental_id, user_id, requested in rentals.iterator(chunk_size=2000):
+            events.append(RentalEvent(
+                rental_id=rental_id, event='requested', to_status='pending', actor_id=user_id, created_at=requested,
+            ))
+            if len(events) == 2000:
+                RentalEvent.objects.bulk_create(events)
+                events = []
+        RentalEvent.objects.bulk_create(events)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0020_payment_verification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RentalEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rental_id', models.BigIntegerField()),
+                ('event', models.CharField(choices=[('requested', 'Requested'), ('paid', 'Advance paid'), ('status', 'Status changed'), ('returned', 'Returned'), ('return_processed', 'Return processed'), ('refunded', 'Refunded')], max_length=20)),
+                ('from_status', models.CharField(blank=True, max_length=10)),
+                ('to_status', models.CharField(max_length=10)),
+                ('note', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['rental_id', 'event', 'created_at'], name='main_rental_rental__0388e7_idx'), models.Index(fields=['to_status', 'created_at'], name='main_rental_to_stat_e4c2c6_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_requests, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0021_rentalevent'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='rentalevent',
+            name='event',
+            field=models.CharField(choices=[('requested', 'Requested'), ('paid', 'Advance paid'), ('verified', 'Payment verified'), ('status', 'Status changed'), ('returned', 'Returned'), ('return_processed', 'Return processed'), ('refunded', 'Refunded')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:11
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_approvals(apps, schema_editor):
+    """Stamp rentals whose approval is in the event log; older ones stay empty"""
+    RentalEvent = apps.get_model('main', 'RentalEvent')
+    approved_at = RentalEvent.objects.filter(
+        rental_id=OuterRef('id'), to_status='approved',
+    ).order_by('created_at').values('created_at')[:1]
+    for name in ('RentalRequest', 'ArchivedRentalRequest'):
+        apps.get_model('main', name).objects.update(approved_at=Subquery(approved_at))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0022_rentalevent_verified'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedrentalrequest',
+            name='approved_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='rentalrequest',
+            name='approved_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_approvals, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,19 @@
-from django.db import models
+import asyncio
+import logging
+
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.utils import timezone
 from decimal import Decimal
 
+from .caching import VersionedQuerySet
+from .geo import grid_cell
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
 # ---------- Custom User ----------
-class CustomUserManager(BaseUserManager):
+class CustomUserManager(BaseUserManager.from_queryset(VersionedQuerySet)):
     def create_user(self, username, email, role='user', **extra_fields):
         if not username or not email:
             raise ValueError("Username and email are required")
@@ -36,6 +45,9 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='user')
     phone = models.CharField(max_length=15, blank=True, null=True)
     address = models.TextField(blank=True, null=True)
+    # Where the farmer is, for nearest-equipment search
+    latitude = models.FloatField(blank=True, null=True)
+    longitude = models.FloatField(blank=True, null=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
@@ -102,17 +114,36 @@ class AgricultureItem(models.Model):
     image = models.ImageField(upload_to='items/', blank=True, null=True)
     is_available = models.BooleanField(default=True)
     added_by = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
+
+    # Where the implement is kept; grid_cell indexes it for nearest search (main/geo.py)
+    latitude = models.FloatField(blank=True, null=True)
+    longitude = models.FloatField(blank=True, null=True)
+    grid_cell = models.IntegerField(blank=True, null=True, editable=False)
     
     # Fields for new item notifications
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # indexed for the API ETag
     is_new = models.BooleanField(default=True)
     new_until = models.DateTimeField(blank=True, null=True)
 
+    # Rental counters maintained on write, see main/counters.py
+    COUNTER_FIELDS = ('rental_count', 'active_rental_count', 'advance_revenue', 'damage_count')
+    rental_count = models.PositiveIntegerField(default=0)
+    active_rental_count = models.PositiveIntegerField(default=0)
+    advance_revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    damage_count = models.PositiveIntegerField(default=0)
+
+    objects = VersionedQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.name} ({self.category})"
     
+    class Meta:
+        indexes = [models.Index(fields=['grid_cell', 'is_available'])]
+
     def save(self, *args, **kwargs):
+        self.grid_cell = grid_cell(self.latitude, self.longitude)
+
         # If this is a new item being created, mark it as new
         if not self.pk:
             self.is_new = True
@@ -123,9 +154,46 @@ class AgricultureItem(models.Model):
             old_item = AgricultureItem.objects.get(pk=self.pk)
             if not old_item.is_available and self.is_available:
                 self.notify_subscribed_users()
+            # Counters change through F() updates; never write back stale copies
+            if kwargs.get('update_fields') is None:
+                kwargs['update_fields'] = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key and field.name not in self.COUNTER_FIELDS
+                ]
         
         super().save(*args, **kwargs)
+
+    def reserve(self):
+        """Atomically mark the item as rented; returns True if this call claimed it"""
+        # Conditional UPDATE: only one of several concurrent requests can match
+        claimed = AgricultureItem.objects.filter(pk=self.pk, is_available=True).update(
+            is_available=False,
+            updated_at=timezone.now(),
+        )
+        if claimed:
+            self.is_available = False
+        return bool(claimed)
+
+    def release(self):
+        """Atomically mark the item as available again; returns True if this call freed it"""
+        freed = AgricultureItem.objects.filter(pk=self.pk, is_available=False).update(
+            is_available=True,
+            updated_at=timezone.now(),
+        )
+        if freed:
+            self.is_available = True
+            # Mail the back-in-stock subscribers once the return is committed
+            transaction.on_commit(self.notify_subscribed_users)
+        return bool(freed)
     
+    def stock_notification_mail(self, user):
+        """Subject and body of the back-in-stock mail for one subscriber"""
+        return (
+            f'{self.name} is Back in Stock! - AgriRentX',
+            f'Hello {user.username},\n\nGood news! The equipment "{self.name}" you were interested in is now back in stock and available for rental.\n\nVisit AgriRentX to rent it now before it gets taken!\n\nBest regards,\nAgriRentX Team',
+        )
+
+    @metrics.track('stock_notification_fanout')
     def notify_subscribed_users(self):
         """Notify users who subscribed for back-in-stock notifications"""
         from django.core.mail import send_mail
@@ -133,21 +201,45 @@ class AgricultureItem(models.Model):
         notifications = StockNotification.objects.filter(item=self, notified=False)
         for notification in notifications:
             try:
-                send_mail(
-                    subject=f'{self.name} is Back in Stock! - AgriRentX',
-                    message=f'Hello {notification.user.username},\n\nGood news! The equipment "{self.name}" you were interested in is now back in stock and available for rental.\n\nVisit AgriRentX to rent it now before it gets taken!\n\nBest regards,\nAgriRentX Team',
-                    from_email=None,
-                    recipient_list=[notification.user.email],
-                    fail_silently=False,
-                )
+                with metrics.track('send_mail'):
+                    subject, message = self.stock_notification_mail(notification.user)
+                    send_mail(
+                        subject=subject,
+                        message=message,
+                        from_email=None,
+                        recipient_list=[notification.user.email],
+                        fail_silently=False,
+                    )
                 notification.notified = True
                 notification.save()
             except Exception as e:
                 print(f"Failed to send notification to {notification.user.email}: {e}")
 
+    async def anotify_subscribed_users(self):
+        """Async notify_subscribed_users: send every back-in-stock mail concurrently"""
+        from .mail import asend_mail
+
+        notifications = [
+            notification async for notification in
+            StockNotification.objects.filter(item=self, notified=False).select_related('user')
+        ]
+        with metrics.track('stock_notification_fanout'):
+            results = await asyncio.gather(
+                *(asend_mail(*self.stock_notification_mail(n.user), [n.user.email]) for n in notifications),
+                return_exceptions=True,
+            )
+        sent = []
+        for notification, result in zip(notifications, results):
+            if isinstance(result, Exception):
+                logger.warning("Failed to send notification to %s: %s", notification.user.email, result)
+            else:
+                sent.append(notification.id)
+        await StockNotification.objects.filter(id__in=sent).aupdate(notified=True)
+
 
 # ---------- Rental Requests ----------
-class RentalRequest(models.Model):
+class RentalRecord(models.Model):
+    """Fields and read-only helpers shared by live and archived rentals"""
     STATUS_CHOICES = (
         ('pending', 'Pending'),
         ('approved', 'Approved'),
@@ -155,15 +247,27 @@ class RentalRequest(models.Model):
         ('returned', 'Returned'),
         ('damaged', 'Damaged'),
     )
+    # Rentals that still hold their item
+    ACTIVE_STATUSES = ('pending', 'approved')
+    # Rentals that can no longer change status, and so can be archived
+    CLOSED_STATUSES = ('rejected', 'returned', 'damaged')
+    # UPI payment note prefix; statements carry it back for reconcile_payments
+    PAYMENT_NOTE_PREFIX = 'AGRX'
 
-    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='rental_requests')
     item = models.ForeignKey(AgricultureItem, on_delete=models.CASCADE)
     request_date = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
 
+    # Pricing captured when the request is made; later item price changes don't apply
+    daily_rate = models.DecimalField(max_digits=8, decimal_places=2)
+    advance_amount = models.DecimalField(max_digits=8, decimal_places=2)
+
     terms_accepted = models.BooleanField(default=False)
     advance_paid = models.BooleanField(default=False)
     payment_reference = models.CharField(max_length=100, blank=True, null=True)
+    paid_at = models.DateTimeField(blank=True, null=True)  # when the farmer confirmed paying
+    payment_verified_at = models.DateTimeField(blank=True, null=True)  # matched on a bank/UPI statement
+    approved_at = models.DateTimeField(blank=True, null=True)  # when an admin approved it; the item goes out
     damage_report = models.TextField(blank=True, null=True)
     penalty_amount = models.DecimalField(max_digits=8, decimal_places=2, blank=True, null=True)
     
@@ -186,12 +290,21 @@ class RentalRequest(models.Model):
     # Deadline notification field
     deadline_notification_sent = models.BooleanField(default=False)
 
+    class Meta:
+        abstract = True
+        ordering = ['-request_date']
+
     def __str__(self):
         return f"{self.user.username} requests {self.item.name} ({self.status})"
-    
+
     def calculate_advance_amount(self):
-        """Calculate 50% advance amount"""
-        return (self.item.price_per_day * Decimal('0.5')).quantize(Decimal('0.01'))
+        """The 50% advance captured when the rental was requested"""
+        return self.advance_amount
+
+    @property
+    def payment_note(self):
+        """Note put on the UPI payment so the statement line can be traced back"""
+        return f"{self.PAYMENT_NOTE_PREFIX}{self.id}"
     
     def calculate_refund_amount(self):
         """Calculate 50% refund amount (50% of advance)"""
@@ -202,7 +315,21 @@ class RentalRequest(models.Model):
         else:
             # Normal refund: 50% of advance (which is 25% of daily rate)
             return (self.calculate_advance_amount() * Decimal('0.5')).quantize(Decimal('0.01'))
-    
+
+
+class RentalRequest(RentalRecord):
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='rental_requests')
+
+    objects = VersionedQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+        # Snapshot the item's price on creation
+        if self.daily_rate is None:
+            self.daily_rate = self.item.price_per_day
+        if self.advance_amount is None:
+            self.advance_amount = (Decimal(self.daily_rate) * Decimal('0.5')).quantize(Decimal('0.01'))
+        super().save(*args, **kwargs)
+
     def days_until_deadline(self):
         """Calculate days until rental deadline (7 days from approval)"""
         if self.status != 'approved' or not self.advance_paid:
@@ -215,23 +342,24 @@ class RentalRequest(models.Model):
         
         return max(days_left, 0)
     
-    def mark_as_returned(self, condition="good", notes=""):
-        """Mark rental as returned"""
-        self.is_returned = True
-        self.return_date = timezone.now()
-        self.return_condition = condition
-        self.return_notes = notes
-        self.status = 'returned'
-        self.save()
-        
-        # Make the item available again
-        self.item.is_available = True
-        self.item.save()
-        
-        # Calculate refund amount
-        refund_amount = self.calculate_refund_amount()
-        self.refund_amount = refund_amount
-        self.save()
+    def mark_as_returned(self, condition="good", notes="", actor=None):
+        """Mark rental as returned and free its item; returns False if it was not out on rent"""
+        # Import here to avoid circular imports
+        from .transitions import transition
+
+        with transaction.atomic():
+            returned = transition(
+                self, 'returned', actor=actor, event='returned', note=condition,
+                is_returned=True,
+                return_date=timezone.now(),
+                return_condition=condition,
+                return_notes=notes,
+                refund_amount=self.calculate_refund_amount(),
+            )
+            if returned:
+                # Make the item available again
+                self.item.release()
+        return returned
 
     def process_refund(self):
         """Process refund to user's wallet"""
@@ -243,5 +371,62 @@ class RentalRequest(models.Model):
             return True
         return False
 
+
+# ---------- Rental Archive ----------
+class ArchivedRentalRequest(RentalRecord):
+    """A closed rental moved out of RentalRequest by archive_rentals; it keeps its id"""
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='archived_rentals')
+    request_date = models.DateTimeField()  # copied from the live row, not reset on insert
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+
+
+# ---------- Rental Events ----------
+class RentalEvent(models.Model):
+    """One change in a rental's life; rows are only ever added (main/events.py)"""
+    EVENT_CHOICES = (
+        ('requested', 'Requested'),
+        ('paid', 'Advance paid'),
+        ('verified', 'Payment verified'),
+        ('status', 'Status changed'),
+        ('returned', 'Returned'),
+        ('return_processed', 'Return processed'),
+        ('refunded', 'Refunded'),
+    )
+
+    # A plain id, not a foreign key: archived rentals keep their id and their history
+    rental_id = models.BigIntegerField()
+    event = models.CharField(max_length=20, choices=EVENT_CHOICES)
+    from_status = models.CharField(max_length=10, blank=True)
+    to_status = models.CharField(max_length=10)
+    actor = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, blank=True, null=True, related_name='+')
+    note = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)  # when recorded, not when flushed
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            # A rental's timeline, and its request time for the durations in time_to_status()
+            models.Index(fields=['rental_id', 'event', 'created_at']),
+            models.Index(fields=['to_status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.rental_id}: {self.from_status or '-'} -> {self.to_status} ({self.event})"
+
+
+# ---------- Item Recommendations ----------
+class ItemRecommendation(models.Model):
+    """Top co-rented items per item, rebuilt offline by build_recommendations"""
+    item = models.ForeignKey(AgricultureItem, on_delete=models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey(AgricultureItem, on_delete=models.CASCADE, related_name='+')
+    score = models.PositiveIntegerField()  # farmers who rented both
+    rank = models.PositiveSmallIntegerField()
+
     class Meta:
-        ordering = ['-request_date']
\ No newline at end of file
+        ordering = ['item', 'rank']
+        unique_together = ['item', 'rank']
+
+    def __str__(self):
+        return f"{self.item_id} -> {self.recommended_id} ({self.score})"
@@ -0,0 +1,78 @@
+"""Signin OTPs kept in the cache instead of the session.
+
+Only an HMAC of each OTP is stored, it expires after OTP_TTL seconds and
+is discarded after OTP_MAX_ATTEMPTS wrong guesses. OTP mails are rate
+limited per username and per client IP with token buckets, checked
+before the user is looked up so abusive traffic never reaches the
+database or the mail server. The buckets are best effort: two racing
+requests may both spend the last token.
+"""
+import secrets
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+# Signed cookie naming the user whose OTP is pending verification
+PENDING_COOKIE = 'otp_user'
+PENDING_COOKIE_SALT = 'main.otp.pending'
+
+
+def generate_otp():
+    """Generate a 7-digit numeric OTP"""
+    return str(secrets.randbelow(9000000) + 1000000)
+
+
+def _otp_hash(user_id, otp):
+    return salted_hmac('main.otp', f"{user_id}:{otp}", algorithm='sha256').hexdigest()
+
+
+# ------------------ THROTTLING ------------------
+def _take_token(key, capacity, refill_seconds):
+    """Spend one token from a bucket holding up to ``capacity`` tokens"""
+    now = time.time()
+    tokens, updated = cache.get(key, (capacity, now))
+    tokens = min(capacity, tokens + (now - updated) / refill_seconds)
+    if tokens < 1:
+        return False
+    cache.set(key, (tokens - 1, now), capacity * refill_seconds)
+    return True
+
+
+def allow_otp_send(username, ip):
+    """Whether another OTP mail may go out for this username and client IP"""
+    return (
+        _take_token(f"otp:ip:{ip}", *settings.OTP_IP_THROTTLE)
+        and _take_token(f"otp:user:{username.lower()}", *settings.OTP_USER_THROTTLE)
+    )
+
+
+# ------------------ ISSUE / CHECK ------------------
+def issue_otp(user_id):
+    """Create a new OTP for the user, replacing any pending one"""
+    otp = generate_otp()
+    cache.set_many({
+        f"otp:code:{user_id}": _otp_hash(user_id, otp),
+        f"otp:attempts:{user_id}": 0,
+    }, settings.OTP_TTL)
+    return otp
+
+
+def check_otp(user_id, otp):
+    """True if ``otp`` is the user's pending OTP; a correct OTP is used up"""
+    code_key, attempts_key = f"otp:code:{user_id}", f"otp:attempts:{user_id}"
+    stored = cache.get(code_key)
+    if stored is None:
+        return False
+    try:
+        attempts = cache.incr(attempts_key)
+    except ValueError:
+        attempts = settings.OTP_MAX_ATTEMPTS + 1
+    if attempts > settings.OTP_MAX_ATTEMPTS:
+        cache.delete_many([code_key, attempts_key])
+        return False
+    if not constant_time_compare(stored, _otp_hash(user_id, otp)):
+        return False
+    cache.delete_many([code_key, attempts_key])
+    return True
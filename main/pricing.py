@@ -0,0 +1,119 @@
+"""Suggested daily prices from utilization, waitlists and category demand.
+
+suggest_prices() scores the whole catalog in one numpy pass:
+
+* utilization over the last PRICING_WINDOW_DAYS against PRICING_TARGET_UTILIZATION,
+* farmers waiting for the item to come back in stock (StockNotification),
+* the category's forecast demand against its recent weekly average.
+
+The weighted score moves the price by at most PRICING_MAX_CHANGE either
+way. Changes under PRICING_MIN_CHANGE, and items too new to judge, get no
+suggestion. Nothing is written; admins apply suggestions with apply_prices().
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from . import analytics
+from .models import AgricultureItem, StockNotification
+
+np = analytics.np
+
+# Weight of each signal in the score; each signal is scaled to [-1, 1]
+WEIGHTS = {'utilization': 0.5, 'waitlist': 0.3, 'demand': 0.2}
+WAITLIST_FULL = 10  # farmers waiting that count as the strongest signal
+DEMAND_WEEKS = 4  # forecast weeks compared with the recent weekly average
+MIN_HISTORY_DAYS = 14  # items in the fleet for less than this are left alone
+
+
+def _demand_ratios(categories):
+    """Forecast demand over the recent weekly average, per category; 1 when unknown"""
+    report = analytics.demand_report() or {'categories': []}
+    ratios = {
+        row['category']: float(np.mean(row['forecast'][:DEMAND_WEEKS])) / row['weekly_average']
+        for row in report['categories'] if row['weekly_average']
+    }
+    return np.array([ratios.get(category, 1.0) for category in categories])
+
+
+def _waitlists(ids):
+    waiting = dict(
+        StockNotification.objects.filter(notified=False).order_by()
+        .values_list('item_id').annotate(count=Count('id'))
+    )
+    return np.array([waiting.get(item_id, 0) for item_id in ids])
+
+
+def suggest_prices():
+    """Suggested prices with their reasons, biggest changes first; None without numpy"""
+    if np is None:
+        return None
+    window = settings.PRICING_WINDOW_DAYS
+    today = timezone.localdate()
+    items, rented, in_fleet = analytics.item_utilization(today - timedelta(days=window - 1), today)
+    if not items:
+        return []
+    ids, names, categories = zip(*items)
+    prices = dict(AgricultureItem.objects.filter(id__in=ids).values_list('id', 'price_per_day'))
+    current = np.array([float(prices.get(item_id, 0)) for item_id in ids])
+
+    target = settings.PRICING_TARGET_UTILIZATION
+    utilization = np.divide(rented, in_fleet, out=np.zeros(len(ids)), where=in_fleet > 0)
+    # Full marks at 100% rented, minus one when never rented
+    utilization_score = np.where(
+        utilization >= target, (utilization - target) / (1 - target), utilization / target - 1,
+    )
+    waitlist = _waitlists(ids)
+    waitlist_score = np.minimum(np.log1p(waitlist) / np.log1p(WAITLIST_FULL), 1)
+    demand = _demand_ratios(categories)
+    demand_score = np.clip((demand - 1) * 2, -1, 1)
+
+    score = (
+        WEIGHTS['utilization'] * utilization_score
+        + WEIGHTS['waitlist'] * waitlist_score
+        + WEIGHTS['demand'] * demand_score
+    )
+    change = score * settings.PRICING_MAX_CHANGE
+    suggested = np.maximum(np.round(current * (1 + change)), 1)
+    actual_change = np.divide(suggested - current, current, out=np.zeros(len(ids)), where=current > 0)
+    eligible = (
+        (in_fleet >= min(MIN_HISTORY_DAYS, window)) & (current > 0)
+        & (np.abs(actual_change) >= settings.PRICING_MIN_CHANGE)
+    )
+
+    suggestions = []
+    for i in np.flatnonzero(eligible)[np.argsort(-np.abs(actual_change[eligible]), kind='stable')]:
+        reasons = [f"Rented {utilization[i]:.0%} of the last {window} days (target {target:.0%})"]
+        if waitlist[i]:
+            reasons.append(f"{waitlist[i]} farmer{'s' if waitlist[i] != 1 else ''} waiting for it")
+        if abs(demand[i] - 1) >= 0.05:
+            reasons.append(f"{categories[i]} demand forecast {demand[i] - 1:+.0%} over the next {DEMAND_WEEKS} weeks")
+        suggestions.append({
+            'id': ids[i],
+            'name': names[i],
+            'category': categories[i],
+            'current_price': prices[ids[i]],
+            'suggested_price': Decimal(int(suggested[i])).quantize(Decimal('0.01')),
+            'change_pct': round(float(actual_change[i]) * 100, 1),
+            'score': round(float(score[i]), 2),
+            'reasons': reasons,
+        })
+    return suggestions
+
+
+def apply_prices(new_prices):
+    """Set price_per_day from an {item id: Decimal} mapping; returns the number of items changed"""
+    items = list(AgricultureItem.objects.filter(id__in=new_prices).only('id', 'price_per_day'))
+    now = timezone.now()
+    changed = []
+    for item in items:
+        if item.price_per_day != new_prices[item.id]:
+            item.price_per_day, item.updated_at = new_prices[item.id], now
+            changed.append(item)
+    with transaction.atomic():
+        AgricultureItem.objects.bulk_update(changed, ['price_per_day', 'updated_at'], batch_size=1000)
+    return len(changed)
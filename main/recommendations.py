@@ -0,0 +1,91 @@
+"""Co-rental recommendations: farmers who rented this also rented.
+
+build_recommendations() turns the distinct (user, item) rental pairs into a
+sparse users x items matrix R; R.T @ R counts, for every pair of items,
+the farmers who rented both. The top ``k`` neighbours of each item are
+stored in ItemRecommendation, so serving them is a single indexed query.
+Building needs numpy and scipy; serving does not.
+"""
+from django.db import transaction
+
+from .archive import rental_history
+from .models import ItemRecommendation
+from .routers import replica_reads
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # pragma: no cover - optional dependency
+    np = sparse = None
+
+DEFAULT_TOP_K = 10
+
+
+# ------------------ OFFLINE BUILD ------------------
+def co_rental_neighbours(pairs, top_k=DEFAULT_TOP_K):
+    """Top-k co-rented items for each item from an (n, 2) array of (user_id, item_id).
+
+    Returns parallel arrays (item_id, recommended_id, score, rank), ranked
+    by score and then by item id so rebuilds are deterministic.
+    """
+    empty = np.empty(0, dtype=np.int64)
+    if len(pairs) == 0:
+        return empty, empty, empty, empty
+
+    user_ids, users = np.unique(pairs[:, 0], return_inverse=True)
+    item_ids, items = np.unique(pairs[:, 1], return_inverse=True)
+    renters = sparse.csr_matrix(
+        (np.ones(len(pairs), dtype=np.int32), (users, items)),
+        shape=(len(user_ids), len(item_ids)),
+    )
+    renters.data[:] = 1  # repeat rentals of one item count once
+    co = (renters.T @ renters).tocoo()
+    off_diagonal = co.row != co.col
+    rows, cols, scores = co.row[off_diagonal], co.col[off_diagonal], co.data[off_diagonal]
+
+    # Sort by item, then score descending, then neighbour id, and keep each item's first k
+    order = np.lexsort((cols, -scores, rows))
+    rows, cols, scores = rows[order], cols[order], scores[order]
+    starts = np.searchsorted(rows, rows, side='left')
+    ranks = np.arange(len(rows)) - starts + 1
+    keep = ranks <= top_k
+    return item_ids[rows[keep]], item_ids[cols[keep]], scores[keep].astype(np.int64), ranks[keep]
+
+
+def build_recommendations(top_k=DEFAULT_TOP_K, batch_size=5000):
+    """Rebuild the ItemRecommendation table; returns the number of rows written"""
+    if np is None:
+        raise ImportError("numpy and scipy are required to build recommendations")
+    with replica_reads():
+        pairs = np.array(
+            list(rental_history(lambda rentals: rentals.values_list('user_id', 'item_id').distinct())),
+            dtype=np.int64,
+        ).reshape(-1, 2)
+    item_ids, recommended_ids, scores, ranks = co_rental_neighbours(pairs, top_k)
+    rows = [
+        ItemRecommendation(item_id=item, recommended_id=recommended, score=score, rank=rank)
+        for item, recommended, score, rank in zip(
+            item_ids.tolist(), recommended_ids.tolist(), scores.tolist(), ranks.tolist()
+        )
+    ]
+    with transaction.atomic():
+        ItemRecommendation.objects.all().delete()
+        ItemRecommendation.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+# ------------------ SERVING ------------------
+def recommendations_for(user, limit=6):
+    """Available items co-rented with the user's rentals that they haven't rented yet"""
+    rented = rental_history(lambda rentals: rentals.filter(user=user).values('item_id'))
+    rows = (
+        ItemRecommendation.objects
+        .filter(item__in=rented, recommended__is_available=True)
+        .exclude(recommended__in=rented)
+        .select_related('recommended')
+        .order_by('-score', 'rank')[:limit * 5]
+    )
+    picked = {}
+    for row in rows:
+        picked.setdefault(row.recommended_id, row.recommended)
+    return list(picked.values())[:limit]
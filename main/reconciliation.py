@@ -0,0 +1,260 @@
+"""Match bank/UPI statement credits to rental advances.
+
+reconcile_statement() reads a statement CSV once, as a stream. The
+rentals awaiting verification are loaded up front into hash indexes:
+
+* by payment note (AGRX<id>), which the payment page adds to every UPI
+  payment and statements carry back in their remarks,
+* by the UTR a farmer typed in on the payment page,
+* by advance amount, each bucket sorted by payment time so the rentals
+  within the matching window of a line are found by bisection.
+
+Each statement line then costs a few dict lookups. Matched rentals are
+marked paid and verified with one guarded UPDATE per batch, and lines that
+match nothing come back with the reason.
+"""
+import csv
+import re
+from bisect import bisect_left, bisect_right
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from .counters import apply_counter_deltas
+from .events import new_event, record_events
+from .models import RentalRequest
+
+DEFAULT_WINDOW = timedelta(hours=48)
+HEADER_SEARCH_ROWS = 30  # statements often start with account details before the header
+
+# Header names used by common bank and UPI statement exports, most specific first
+COLUMN_ALIASES = {
+    'date': ('transaction date', 'txn date', 'value date', 'date', 'timestamp'),
+    'amount': ('credit amount', 'credit', 'deposit amount', 'deposit', 'amount'),
+    'reference': (
+        'utr', 'utr number', 'upi ref no', 'upi reference', 'reference number',
+        'ref no', 'reference', 'transaction id', 'txn id',
+    ),
+    'remarks': ('remarks', 'narration', 'description', 'particulars', 'note'),
+}
+REQUIRED_COLUMNS = ('date', 'amount')
+DATE_FORMATS = (
+    '%d-%m-%Y %H:%M:%S', '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d-%m-%Y %H:%M',
+    '%d-%m-%Y', '%d/%m/%Y', '%d %b %Y', '%d-%b-%Y', '%d-%b-%y',
+)
+NOTE_PATTERN = re.compile(rf"{RentalRequest.PAYMENT_NOTE_PREFIX}(\d+)", re.IGNORECASE)
+
+
+class StatementError(Exception):
+    """The file can't be read as a bank/UPI statement"""
+
+
+# ------------------ PARSING ------------------
+def statement_columns(header):
+    """Position of each known column in a header row; None if the row is not a header"""
+    names = [name.strip().lower() for name in header]
+    columns = {}
+    for column, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in names:
+                columns[column] = names.index(alias)
+                break
+    if any(column not in columns for column in REQUIRED_COLUMNS):
+        return None
+    return columns
+
+
+def parse_amount(text):
+    """A statement amount such as '1,250.00' or '₹ 300' as a Decimal; None when blank or invalid"""
+    text = text.replace(',', '').replace('₹', '').replace('INR', '').strip()
+    if not text:
+        return None
+    try:
+        return Decimal(text)
+    except InvalidOperation:
+        return None
+
+
+class _DateParser:
+    """Parse statement timestamps, trying the format that worked last first"""
+
+    def __init__(self):
+        self.formats = list(DATE_FORMATS)
+
+    def __call__(self, text):
+        text = text.strip()
+        try:
+            value = datetime.fromisoformat(text)
+        except ValueError:
+            for i, fmt in enumerate(self.formats):
+                try:
+                    value = datetime.strptime(text, fmt)
+                except ValueError:
+                    continue
+                if i:
+                    self.formats.insert(0, self.formats.pop(i))
+                break
+            else:
+                return None
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        return value
+
+
+# ------------------ MATCHING ------------------
+class PaymentIndex:
+    """Rentals awaiting payment verification, indexed for statement lookups"""
+
+    def __init__(self, rentals, window=DEFAULT_WINDOW):
+        self.window = window.total_seconds()
+        self.advances = {}  # rental id -> advance amount
+        self.by_reference = {}  # farmer-entered UTR -> rental id
+        self.references = {}  # rental id -> farmer-entered UTR
+        self.matched = {}  # rental id -> payment reference to store
+        buckets = defaultdict(list)
+        for rental_id, advance, reference, paid_at, requested in rentals:
+            self.advances[rental_id] = advance
+            if reference:
+                self.by_reference[reference.strip().upper()] = rental_id
+                self.references[rental_id] = reference
+            else:
+                # Rentals with a UTR of their own only match a line carrying it
+                buckets[advance].append(((paid_at or requested).timestamp(), rental_id))
+        self.times, self.ids = {}, {}
+        for advance, entries in buckets.items():
+            entries.sort()
+            self.times[advance] = [when for when, _ in entries]
+            self.ids[advance] = [rental_id for _, rental_id in entries]
+
+    @classmethod
+    def awaiting_verification(cls, window=DEFAULT_WINDOW):
+        """Index every rental whose terms are accepted and whose payment is not yet verified"""
+        rentals = (
+            RentalRequest.objects.filter(terms_accepted=True, payment_verified_at__isnull=True)
+            .order_by().values_list('id', 'advance_amount', 'payment_reference', 'paid_at', 'request_date')
+        )
+        return cls(rentals.iterator(chunk_size=5000), window)
+
+    def _claim(self, rental_id, amount, reference, how):
+        if rental_id in self.matched:
+            return None, f"{RentalRequest.PAYMENT_NOTE_PREFIX}{rental_id} was already paid earlier in this statement"
+        if amount != self.advances[rental_id]:
+            return None, f"{RentalRequest.PAYMENT_NOTE_PREFIX}{rental_id} expects ₹{self.advances[rental_id]}"
+        self.matched[rental_id] = self.references.get(rental_id) or reference.strip() or None
+        return rental_id, how
+
+    def match(self, amount, when, reference='', remarks=''):
+        """(rental id, how it matched) for one statement credit, or (None, why not)"""
+        note = NOTE_PATTERN.search(f"{reference} {remarks}")
+        if note:
+            rental_id = int(note.group(1))
+            if rental_id not in self.advances:
+                return None, f"{note.group(0)} is not awaiting payment"
+            return self._claim(rental_id, amount, reference, 'note')
+
+        key = reference.strip().upper()
+        if key and key in self.by_reference:
+            return self._claim(self.by_reference[key], amount, reference, 'reference')
+
+        times = self.times.get(amount)
+        if times is None or when is None:
+            return None, "no rental awaiting this amount"
+        stamp = when.timestamp()
+        ids = self.ids[amount]
+        candidates = [
+            ids[i] for i in range(bisect_left(times, stamp - self.window), bisect_right(times, stamp + self.window))
+            if ids[i] not in self.matched
+        ]
+        if len(candidates) == 1:
+            return self._claim(candidates[0], amount, reference, 'amount and time')
+        if candidates:
+            return None, f"{len(candidates)} rentals of ₹{amount} were paid around then"
+        return None, "no rental awaiting this amount around then"
+
+
+def reconcile_statement(lines, index):
+    """Match every credit in a statement CSV against ``index``.
+
+    ``lines`` is any iterable of CSV text lines, such as an open file.
+    Returns (counts, unmatched): counts by outcome, and (line number,
+    row, reason) for each credit that matched no rental. Matches are left
+    in ``index.matched`` for mark_verified().
+    """
+    reader = csv.reader(lines)
+    columns = None
+    for row in reader:
+        columns = statement_columns(row)
+        if columns or reader.line_num >= HEADER_SEARCH_ROWS:
+            break
+    if columns is None:
+        raise StatementError(f"No header with {' and '.join(REQUIRED_COLUMNS)} columns in the first {HEADER_SEARCH_ROWS} lines")
+
+    date_at, amount_at = columns['date'], columns['amount']
+    reference_at, remarks_at = columns.get('reference'), columns.get('remarks')
+    width = max(columns.values()) + 1
+    parse_date = _DateParser()
+    counts, unmatched = Counter(), []
+    for row in reader:
+        if len(row) < width:
+            counts['skipped'] += 1
+            continue
+        amount = parse_amount(row[amount_at])
+        if amount is None or amount <= 0:
+            counts['skipped'] += 1  # debits, blank and summary lines
+            continue
+        rental_id, how = index.match(
+            amount,
+            parse_date(row[date_at]),
+            row[reference_at] if reference_at is not None else '',
+            row[remarks_at] if remarks_at is not None else '',
+        )
+        if rental_id is None:
+            counts['unmatched'] += 1
+            unmatched.append((reader.line_num, row, how))
+        else:
+            counts[f"matched by {how}"] += 1
+    return counts, unmatched
+
+
+def mark_verified(matched, batch_size=1000):
+    """Mark rentals paid and verified from a {rental id: payment reference} mapping.
+
+    Rentals already verified, for instance by a run at the same time, are
+    left alone. Returns how many rentals this call verified.
+    """
+    now = timezone.now()
+    ids = list(matched)
+    verified = 0
+    with transaction.atomic():
+        revenue, events = Counter(), []
+        for start in range(0, len(ids), batch_size):
+            rentals = list(
+                RentalRequest.objects.select_for_update()
+                .filter(id__in=ids[start:start + batch_size], payment_verified_at__isnull=True)
+                .values_list('id', 'item_id', 'status', 'advance_paid', 'advance_amount')
+            )
+            if not rentals:
+                continue
+            locked = [row[0] for row in rentals]
+            references = [When(id=rental_id, then=Value(matched[rental_id])) for rental_id in locked if matched[rental_id]]
+            # One UPDATE per batch, still guarded so a verification made meanwhile is not overwritten
+            verified += RentalRequest.objects.filter(id__in=locked, payment_verified_at__isnull=True).update(
+                advance_paid=True,
+                payment_verified_at=now,
+                payment_reference=Case(*references, default=F('payment_reference')),
+            )
+            for rental_id, item_id, status, advance_paid, advance in rentals:
+                reference = matched[rental_id] or ''
+                if not advance_paid:
+                    # Advances not yet marked paid now count in their item's revenue
+                    revenue[item_id] += advance
+                    events.append(new_event(rental_id, 'paid', status, status, note=reference))
+                events.append(new_event(rental_id, 'verified', status, status, note=reference))
+        for item_id, amount in revenue.items():
+            apply_counter_deltas(item_id, {'advance_revenue': amount})
+        record_events(events)
+    return verified
@@ -0,0 +1,55 @@
+"""Send reporting reads to a read replica.
+
+Reads go to settings.REPLICA_DATABASE only inside replica_reads(), which
+is both a context manager and a view decorator. Everything else stays on
+``default``: writes, and the read-after-write paths like payments and
+refunds, never see replication lag. Inside a transaction on the primary,
+reads also stay on the primary.
+
+Without a replica alias in DATABASES every read uses ``default``.
+"""
+import contextvars
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_reporting = contextvars.ContextVar('agrirentx_replica_reads', default=False)
+
+
+def replica_alias():
+    """The database reporting reads use: the replica when configured, else default"""
+    alias = getattr(settings, 'REPLICA_DATABASE', None)
+    return alias if alias in settings.DATABASES else DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def replica_reads():
+    """Route reads in this block, or in the decorated view, to the replica"""
+    token = _reporting.set(True)
+    try:
+        yield
+    finally:
+        _reporting.reset(token)
+
+
+class ReplicaRouter:
+    """Reporting reads to the replica, everything else to the primary"""
+
+    def db_for_read(self, model, **hints):
+        if _reporting.get() and not connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replication carries the schema; never migrate the replica itself
+        if db != DEFAULT_DB_ALIAS and db == replica_alias():
+            return False
+        return None
@@ -0,0 +1,56 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .caching import bump_model_version
+from .counters import RENTAL_STATE_FIELDS, apply_counter_deltas, contribution_of, rental_contribution
+from .models import CustomUser, AgricultureItem, RentalRequest, ArchivedRentalRequest
+
+
+# ------------------ FRAGMENT CACHE INVALIDATION ------------------
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+@receiver(post_save, sender=AgricultureItem)
+@receiver(post_delete, sender=AgricultureItem)
+@receiver(post_save, sender=RentalRequest)
+@receiver(post_delete, sender=RentalRequest)
+def bump_cached_fragments(sender, **kwargs):
+    """Any change to a model invalidates the dashboard fragments built from it"""
+    bump_model_version(sender._meta.label_lower)
+
+
+# ------------------ ITEM RENTAL COUNTERS ------------------
+@receiver(pre_save, sender=RentalRequest)
+def remember_counted_state(sender, instance, update_fields=None, **kwargs):
+    """Load the stored state of a rental so post_save can count only the change"""
+    instance._counted_state = None
+    if instance._state.adding:
+        return
+    if update_fields is not None and not set(update_fields) & {'item', 'status', 'advance_paid', 'return_condition', 'advance_amount'}:
+        instance._counted_state = 'unchanged'
+        return
+    instance._counted_state = RentalRequest.objects.filter(pk=instance.pk).values(*RENTAL_STATE_FIELDS).first()
+
+
+@receiver(post_save, sender=RentalRequest)
+def count_rental_change(sender, instance, created, **kwargs):
+    """Move the item's counters by the difference between the old and new state"""
+    old = getattr(instance, '_counted_state', None)
+    instance._counted_state = None
+    if old == 'unchanged':
+        return
+    new = contribution_of(instance)
+    if created or old is None:
+        apply_counter_deltas(instance.item_id, new)
+        return
+    previous = rental_contribution(old['status'], old['advance_paid'], old['return_condition'], old['advance_amount'])
+    if old['item_id'] != instance.item_id:
+        apply_counter_deltas(old['item_id'], previous, sign=-1)
+        apply_counter_deltas(instance.item_id, new)
+        return
+    apply_counter_deltas(instance.item_id, {field: new[field] - previous[field] for field in new})
+
+
+@receiver(post_delete, sender=RentalRequest)
+@receiver(post_delete, sender=ArchivedRentalRequest)
+def uncount_rental(sender, instance, **kwargs):
+    apply_counter_deltas(instance.item_id, contribution_of(instance), sign=-1)
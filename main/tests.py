@@ -1,3 +1,985 @@
-from django.test import TestCase
+import csv
+import json
+import random
+import threading
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, router, transaction
+from django.test import AsyncClient, Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .archive import archive_rentals
+from .benchmarks import LIFECYCLE_STEPS, OTP_PATTERN, retry_on_lock, run_lifecycle_benchmark
+from .caching import model_versions
+from .exports import EXPORTS
+from .counters import reconcile_counters
+from .events import record_event, time_to_status
+from .models import CustomUser, AgricultureItem, RentalRequest, ArchivedRentalRequest, RentalEvent, StockNotification
+from .otp import check_otp, issue_otp
+from .reconciliation import PaymentIndex, mark_verified, reconcile_statement
+from .routers import replica_reads
+from .transitions import InvalidTransition, transition
+from .geo import grid_cell, haversine_km, nearest_available_items
+from . import analytics, metrics, pricing, recommendations
+
+
+# ---------- Fixtures ----------
+class RentalFixtureMixin:
+    """An admin, an approved farmer and one item for the tests of a class.
+
+    TestCase creates them once per class. TransactionTestCase empties the
+    database after every test, so there they are created again in setUp.
+    """
+    ITEM = {'name': 'Disc Harrow', 'category': 'Ploughs', 'description': 'Sixteen disc harrow', 'price_per_day': Decimal('700.00')}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user('admin', 'admin@example.com', role='admin')
+        cls.farmer = CustomUser.objects.create_user('farmer', 'farmer@example.com', status='approved')
+        cls.item = AgricultureItem.objects.create(added_by=cls.admin, **cls.ITEM)
+
+    def setUp(self):
+        super().setUp()
+        if not isinstance(self, TestCase):
+            self.setUpTestData()
+
+
+# ---------- Rental reservation ----------
+# Cookie sessions keep the django_session table out of the race under test, and
+# requests queued behind SQLite's write lock are slow by design, not worth a log line
+@override_settings(
+    SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies',
+    SLOW_REQUEST_THRESHOLD_MS=60_000,
+)
+class AcceptTermsConcurrencyTests(RentalFixtureMixin, TransactionTestCase):
+    """Concurrent accept_terms requests must never double book an item"""
+
+    CONCURRENT_REQUESTS = 200
+    ITEM = {'name': 'Seed Drill', 'category': 'Seeders', 'description': 'Nine row seed drill', 'price_per_day': Decimal('800.00')}
+
+    def setUp(self):
+        super().setUp()
+        self.users = [
+            CustomUser.objects.create_user(
+                f'farmer{i}', f'farmer{i}@example.com',
+                status='approved', is_aadhaar_verified=True,
+            )
+            for i in range(self.CONCURRENT_REQUESTS)
+        ]
+
+    def test_single_booking_under_concurrent_requests(self):
+        url = reverse('accept_terms', args=[self.item.id])
+        barrier = threading.Barrier(self.CONCURRENT_REQUESTS)
+        status_codes = []
+
+        clients = []
+        for user in self.users:
+            client = Client()
+            client.force_login(user)
+            clients.append(client)
+
+        errors = []
+
+        def submit(client):
+            barrier.wait(timeout=60)
+            try:
+                # SQLite refuses concurrent writers with "table is locked"
+                # instead of waiting, so retry like a client would, a bounded number of times
+                status_codes.append(retry_on_lock(client.post, url).status_code)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=submit, args=(client,)) for client in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(status_codes, [302] * self.CONCURRENT_REQUESTS)
+        self.assertEqual(RentalRequest.objects.filter(item=self.item).count(), 1)
+        self.item.refresh_from_db()
+        self.assertFalse(self.item.is_available)
+
+    def test_unavailable_item_is_not_booked(self):
+        self.item.reserve()
+        client = Client()
+        client.force_login(self.users[0])
+        response = client.post(reverse('accept_terms', args=[self.item.id]))
+        self.assertRedirects(response, reverse('user_dashboard'), fetch_redirect_response=False)
+        self.assertFalse(RentalRequest.objects.exists())
+
+
+# ---------- Anonymous page cache ----------
+class PageCacheTests(TestCase):
+    """Anonymous visitors share one cached copy of a page; logged-in users never get it"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_visits_hit_the_cache(self):
+        first = self.client.get(reverse('landing'))
+        self.assertTemplateUsed(first, 'landing.html')
+        self.assertIn('Cookie', first['Vary'])
+
+        # Tracking parameters the page does not read share the entry
+        second = self.client.get(reverse('landing'), {'utm_source': 'whatsapp', 'gclid': 'abc'})
+        self.assertTemplateNotUsed(second, 'landing.html')
+        self.assertEqual(second.content, first.content)
+        self.assertIn('Cookie', second['Vary'])
+
+    def test_logged_in_users_bypass_the_cache(self):
+        self.client.get(reverse('about'))
+        self.client.force_login(CustomUser.objects.create_user('farmer', 'farmer@example.com', status='approved'))
+
+        response = self.client.get(reverse('about'))
+        self.assertTemplateUsed(response, 'about.html')
+        self.assertIn('Cookie', response['Vary'])
+
+
+# ---------- Catalog API ----------
+class CatalogApiTests(RentalFixtureMixin, TestCase):
+    """The catalog API pages by id cursor, filters, and answers 304 while nothing changed"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for name, category, available in [
+            ('Seed Drill', 'Seeders', True), ('Power Sprayer', 'Sprayers', True),
+            ('Boom Sprayer', 'Sprayers', False), ('Knapsack Sprayer', 'Sprayers', True),
+        ]:
+            AgricultureItem.objects.create(
+                name=name, category=category, description=name, price_per_day=Decimal('300.00'),
+                added_by=cls.admin, is_available=available,
+            )
+        cls.url = reverse('api_items')
+
+    def test_cursor_pages_through_every_item(self):
+        names, url, pages = [], self.url + '?limit=2', 0
+        while url:
+            body = self.client.get(url).json()
+            names += [row['name'] for row in body['results']]
+            url, pages = body['next'], pages + 1
+
+        self.assertEqual(pages, 3)
+        self.assertEqual(names, list(AgricultureItem.objects.order_by('id').values_list('name', flat=True)))
+
+    def test_filters(self):
+        response = self.client.get(self.url, {'category': 'Sprayers', 'available': 'true'})
+        self.assertEqual([row['name'] for row in response.json()['results']], ['Power Sprayer', 'Knapsack Sprayer'])
+        response = self.client.get(self.url, {'available': '0'})
+        self.assertEqual([row['name'] for row in response.json()['results']], ['Boom Sprayer'])
+
+    def test_unchanged_catalog_is_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Other filters are another representation
+        self.assertEqual(self.client.get(self.url, {'category': 'Seeders'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        self.item.price_per_day = Decimal('750.00')
+        self.item.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_bad_cursor_or_limit(self):
+        for params in ({'cursor': 'abc'}, {'limit': 'ten'}, {'limit': 0}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn('error', response.json())
+
+
+# ---------- Streamed exports ----------
+class ExportTests(RentalFixtureMixin, TransactionTestCase):
+    """Exports stream every row of a dataset with its header, as CSV or NDJSON"""
+
+    # Exports read through the replica connection, which only sees committed rows
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        super().setUp()
+        for _ in range(3):
+            RentalRequest.objects.create(user=self.farmer, item=self.item)
+        self.client.force_login(self.admin)
+
+    def export(self, dataset, fmt):
+        response = self.client.get(reverse('admin_export', args=[dataset]), {'format': fmt})
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode().splitlines()
+
+    def test_csv(self):
+        header, *rows = csv.reader(self.export('rentals', 'csv'))
+        self.assertEqual(tuple(header), EXPORTS['rentals'][1])
+        self.assertEqual(len(rows), 3)
+        self.assertEqual({row[header.index('item__name')] for row in rows}, {'Disc Harrow'})
+
+    def test_ndjson(self):
+        rows = [json.loads(line) for line in self.export('users', 'ndjson')]
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(tuple(rows[0]), EXPORTS['users'][1])
+
+
+# ---------- Performance middleware ----------
+class PerformanceMiddlewareTests(RentalFixtureMixin, TestCase):
+    """Each response reports its DB and template time; slow ones are logged with their SQL"""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.admin)
+        self.url = reverse('admin_dashboard_section', args=['items'])
+
+    def test_server_timing_counts_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+
+        stats = response.wsgi_request.performance_stats
+        # The session and user lookups run inside the middleware too
+        self.assertEqual(len(stats.queries), len(queries))
+        self.assertGreater(stats.template_ms, 0)
+        self.assertIn(f'db;dur={stats.db_ms:.1f};desc="{len(queries)} queries"', response['Server-Timing'])
+        self.assertRegex(response['Server-Timing'], r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+$')
+
+    def test_slow_requests_are_logged_with_their_sql(self):
+        with self.settings(SLOW_REQUEST_THRESHOLD_MS=0), self.assertLogs('main.performance', 'WARNING') as logs:
+            self.client.get(self.url)
+
+        [message] = logs.output
+        self.assertIn(f"Slow request GET {self.url} (admin_dashboard_section)", message)
+        self.assertRegex(message, r'\d+ queries in [\d.]+ms')
+        self.assertIn('ms x1: SELECT', message)
+
+
+# ---------- Prometheus metrics ----------
+class MetricsTests(TestCase):
+    """/metrics serves the Prometheus text format to allowed addresses only"""
+
+    @skipUnless(metrics.prometheus_client is not None, "prometheus_client is not installed")
+    def test_allowed_address_gets_metrics(self):
+        self.client.get(reverse('landing'))
+        with metrics.track('invoice_pdf'):
+            pass
+
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='127.0.0.1')
+
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        for name in (
+            'agrirentx_request_duration_seconds_count{method="GET",url_name="landing"}',
+            'agrirentx_db_queries_total{url_name="landing"}',
+            'agrirentx_db_query_seconds_total{url_name="landing"}',
+            'agrirentx_operation_duration_seconds_count{operation="invoice_pdf"}',
+        ):
+            self.assertIn(name, body)
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.5'])
+    def test_other_addresses_are_refused(self):
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='203.0.113.9')
+        self.assertEqual(response.status_code, 403)
+        self.assertNotIn(b'agrirentx_', response.content)
+
+
+# ---------- Lifecycle benchmark ----------
+class LifecycleBenchmarkTests(TransactionTestCase):
+    """The benchmark harness must drive every step of the rental lifecycle"""
+
+    def test_every_step_succeeds(self):
+        timings, failures = run_lifecycle_benchmark(users=3, concurrency=1)
+
+        self.assertEqual(failures, [])
+        self.assertEqual([row['count'] for row in timings.report()], [3] * len(LIFECYCLE_STEPS))
+        self.assertEqual(RentalRequest.objects.filter(refund_processed=True).count(), 3)
+
+
+# ---------- Synthetic data generator ----------
+class GenerateDataTests(TestCase):
+    """generate_data creates the requested rows, the same ones for the same seed, once"""
+
+    def generate(self, seed=7):
+        call_command(
+            'generate_data', users=20, items=8, rentals=120, notifications=10, days=60, seed=seed,
+            stdout=StringIO(),
+        )
+        return list(
+            RentalRequest.objects.filter(user__username__startswith=f'synth{seed}_').order_by('id')
+            .values_list('user__username', 'item__name', 'status', 'daily_rate', 'advance_paid', 'refund_amount')
+        )
+
+    def test_creates_counted_rows(self):
+        started = timezone.now()
+        self.generate()
+
+        self.assertEqual(CustomUser.objects.filter(username__startswith='synth7_').count(), 20)
+        self.assertEqual(AgricultureItem.objects.count(), 8)
+        self.assertEqual(RentalRequest.objects.count(), 120)
+        self.assertLessEqual(StockNotification.objects.count(), 10)
+        self.assertEqual(reconcile_counters(), [])
+        # Items left out on a rental were changed now, not when they were created
+        busy = AgricultureItem.objects.filter(is_available=False)
+        self.assertTrue(busy.exists())
+        self.assertFalse(busy.filter(updated_at__lt=started).exists())
+
+    def test_same_seed_same_data_and_no_reuse(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            first = self.generate()
+            raise RuntimeError  # roll back so the seed can be generated again
+        self.assertEqual(self.generate(), first)
+
+        with self.assertRaisesMessage(CommandError, "Data for seed 7 already exists"):
+            self.generate()
+        self.assertNotEqual(self.generate(seed=8), [])
+
+
+# ---------- Async views ----------
+class AsyncViewTests(TestCase):
+    """The async views must behave like the sync ones they replaced"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user('admin', 'admin@example.com', role='admin')
+        cls.farmers = [
+            CustomUser.objects.create_user(f'farmer{i}', f'farmer{i}@example.com', status='approved')
+            for i in range(3)
+        ]
+
+    async def test_signin_mails_an_otp_that_logs_in(self):
+        await cache.aclear()
+        client = AsyncClient()
+        response = await client.post(reverse('user_signin'), {'username': 'farmer0', 'email': 'farmer0@example.com'})
+        self.assertRedirects(response, reverse('user_verify_otp'), fetch_redirect_response=False)
+
+        otp = OTP_PATTERN.search(mail.outbox[0].body).group(1)
+        response = await client.post(reverse('user_verify_otp'), {'otp': otp})
+        self.assertRedirects(response, reverse('user_dashboard'), fetch_redirect_response=False)
+        session = await client.asession()
+        self.assertEqual(await session.aget('_auth_user_id'), str(self.farmers[0].id))
+
+    async def test_restocking_notifies_every_subscriber(self):
+        item = await AgricultureItem.objects.acreate(
+            name='Power Sprayer', category='Sprayers', description='Backpack power sprayer',
+            price_per_day='300.00', added_by=self.admin, is_available=False,
+        )
+        for farmer in self.farmers:
+            await StockNotification.objects.acreate(user=farmer, item=item)
+        client = AsyncClient()
+        await client.aforce_login(self.admin)
+
+        response = await client.get(reverse('change_item_availability', args=[item.id]))
+
+        self.assertRedirects(response, reverse('admin_dashboard'), fetch_redirect_response=False)
+        await item.arefresh_from_db()
+        self.assertTrue(item.is_available)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), [f.email for f in self.farmers])
+        self.assertFalse(await StockNotification.objects.filter(notified=False).aexists())
+
+
+# ---------- OTP ----------
+class OTPTests(TestCase):
+    """OTPs expire after a few wrong guesses and OTP mails are throttled"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_otp_is_discarded_after_max_attempts(self):
+        otp = issue_otp(1)
+        wrong = '0000000' if otp != '0000000' else '1111111'
+        for _ in range(settings.OTP_MAX_ATTEMPTS):
+            self.assertFalse(check_otp(1, wrong))
+        self.assertFalse(check_otp(1, otp))
+
+    def test_otp_can_be_used_once(self):
+        otp = issue_otp(1)
+        self.assertTrue(check_otp(1, otp))
+        self.assertFalse(check_otp(1, otp))
+
+    @override_settings(OTP_USER_THROTTLE=(2, 3600))
+    def test_signin_is_throttled_before_mail_is_sent(self):
+        CustomUser.objects.create_user('farmer', 'farmer@example.com', status='approved')
+        form = {'username': 'farmer', 'email': 'farmer@example.com'}
+        codes = [Client().post(reverse('user_signin'), form).status_code for _ in range(3)]
+
+        self.assertEqual(codes, [302, 302, 429])
+        self.assertEqual(len(mail.outbox), 2)
+
+
+# ---------- Bulk admin actions ----------
+class BulkAdminActionTests(RentalFixtureMixin, TestCase):
+    """Bulk actions update every eligible row in one go and skip the rest"""
+
+    ITEM = {'name': 'Rotavator', 'category': 'Ploughs', 'description': 'Tractor mounted rotavator', 'price_per_day': Decimal('900.00')}
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.admin)
+
+    def rental(self, **fields):
+        return RentalRequest.objects.create(user=self.farmer, item=self.item, **fields)
+
+    def test_bulk_approval_checks_terms_and_advance(self):
+        ready = self.rental(terms_accepted=True, advance_paid=True)
+        unpaid = self.rental(terms_accepted=True)
+        returned = self.rental(terms_accepted=True, advance_paid=True, status='returned')
+
+        response = self.client.post(
+            reverse('bulk_rental_status', args=['approved']),
+            {'ids': [ready.id, unpaid.id, returned.id]},
+            follow=True,
+        )
+
+        statuses = dict(RentalRequest.objects.values_list('id', 'status'))
+        self.assertEqual(statuses, {ready.id: 'approved', unpaid.id: 'pending', returned.id: 'returned'})
+        self.assertContains(response, "1 rental requests approved, 2 skipped")
+
+    def test_bulk_actions_require_post(self):
+        response = self.client.get(reverse('bulk_user_status', args=['approved']))
+        self.assertEqual(response.status_code, 405)
+
+
+# ---------- Admin dashboard sections ----------
+class AdminDashboardSectionTests(TestCase):
+    """The dashboard only counts rows; each section pages through them on its own"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user('admin', 'admin@example.com', role='admin')
+        CustomUser.objects.bulk_create(
+            CustomUser(username=f'farmer{i}', email=f'farmer{i}@example.com') for i in range(30)
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_dashboard_renders_counts_without_rows(self):
+        response = self.client.get(reverse('admin_dashboard'))
+
+        self.assertEqual(response.context['counts']['users'], 30)
+        self.assertNotContains(response, 'farmer0@example.com')
+
+    def test_section_is_paginated(self):
+        url = reverse('admin_dashboard_section', args=['users'])
+        first, second = self.client.get(url), self.client.get(url, {'page': 2})
+
+        self.assertEqual(len(first.context['users']), 25)
+        self.assertEqual(len(second.context['users']), 5)
+        self.assertContains(second, 'farmer29@example.com')
+        self.assertEqual(self.client.get(reverse('admin_dashboard_section', args=['nope'])).status_code, 404)
+
+
+# ---------- Fragment cache ----------
+class FragmentCacheTests(RentalFixtureMixin, TransactionTestCase):
+    """Writes, including update() and bulk_update(), invalidate cached fragments once committed"""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.admin)
+        self.url = reverse('admin_dashboard_section', args=['items'])
+
+    def test_writes_refresh_item_grid(self):
+        self.assertContains(self.client.get(self.url), 'Disc Harrow')
+
+        AgricultureItem.objects.filter(pk=self.item.pk).update(name='Offset Harrow')
+        self.assertContains(self.client.get(self.url), 'Offset Harrow')
+
+        self.item.name = 'Tandem Harrow'
+        AgricultureItem.objects.bulk_update([self.item], ['name'])
+        self.assertContains(self.client.get(self.url), 'Tandem Harrow')
+
+        self.item.name = 'Spike Harrow'
+        self.item.save()
+        self.assertContains(self.client.get(self.url), 'Spike Harrow')
+
+    def test_version_is_bumped_on_commit(self):
+        label = AgricultureItem._meta.label_lower
+        before = model_versions(label)
+        with transaction.atomic():
+            self.item.reserve()
+            # A page rendered now still reads the old row, so it must not get a new version
+            self.assertEqual(model_versions(label), before)
+        self.assertNotEqual(model_versions(label), before)
+
+        before = model_versions(label)
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.item.release()
+            raise RuntimeError
+        self.assertEqual(model_versions(label), before)
+
+
+# ---------- Item rental counters ----------
+class ItemCounterTests(RentalFixtureMixin, TestCase):
+    """Rental state changes keep the item's counters in step with the rentals table"""
+
+    ITEM = {'name': 'Power Sprayer', 'category': 'Sprayers', 'description': 'Sixteen litre power sprayer', 'price_per_day': Decimal('300.00')}
+
+    def counters(self):
+        self.item.refresh_from_db()
+        return (self.item.rental_count, self.item.active_rental_count, self.item.advance_revenue, self.item.damage_count)
+
+    def test_counters_follow_rental_lifecycle(self):
+        rental = RentalRequest.objects.create(user=self.farmer, item=self.item, terms_accepted=True)
+        self.assertEqual(self.counters(), (1, 1, 0, 0))
+
+        rental.advance_paid = True
+        rental.save()
+        self.assertEqual(self.counters(), (1, 1, 150, 0))
+
+        self.assertTrue(transition(rental, 'approved'))
+        self.assertEqual(self.counters(), (1, 1, 150, 0))
+
+        rental.mark_as_returned(condition='damaged')
+        self.assertEqual(self.counters(), (1, 0, 150, 1))
+
+        RentalRequest.objects.create(user=self.farmer, item=self.item)
+        self.assertEqual(self.counters(), (2, 1, 150, 1))
+        self.assertEqual(reconcile_counters(), [])
+
+    def test_price_change_keeps_rental_snapshot(self):
+        rental = RentalRequest.objects.create(user=self.farmer, item=self.item, advance_paid=True)
+        self.item.price_per_day = Decimal('500.00')
+        self.item.save()
+
+        rental = RentalRequest.objects.get(pk=rental.pk)
+        self.assertEqual((rental.daily_rate, rental.calculate_advance_amount()), (300, 150))
+        self.assertEqual(reconcile_counters(), [])
+
+    def test_reconcile_repairs_drift(self):
+        RentalRequest.objects.create(user=self.farmer, item=self.item)
+        AgricultureItem.objects.filter(pk=self.item.pk).update(rental_count=7)
+
+        self.assertEqual(len(reconcile_counters(fix=True)), 1)
+        self.assertEqual(self.counters(), (1, 1, 0, 0))
+
+
+# ---------- Recommendations ----------
+@skipUnless(recommendations.np is not None, "numpy and scipy are not installed")
+class RecommendationTests(TransactionTestCase):
+    """Items are recommended by how many farmers rented them together"""
+
+    # The replica connection only sees committed rows, so the test data must be committed
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        admin = CustomUser.objects.create_user('admin', 'admin@example.com', role='admin')
+        self.items = {
+            name: AgricultureItem.objects.create(
+                name=name, category='Ploughs', description=name, price_per_day=Decimal('400.00'), added_by=admin,
+            )
+            for name in ('plough', 'harrow', 'leveller')
+        }
+        self.farmers = [
+            CustomUser.objects.create_user(f'farmer{i}', f'farmer{i}@example.com', status='approved')
+            for i in range(3)
+        ]
+        for farmer, names in zip(self.farmers, [('plough', 'harrow'), ('plough', 'harrow', 'leveller'), ('plough',)]):
+            for name in names:
+                RentalRequest.objects.create(user=farmer, item=self.items[name])
+
+    def test_recommends_most_co_rented_items_first(self):
+        recommendations.build_recommendations(top_k=5)
+
+        self.assertEqual(
+            [item.name for item in recommendations.recommendations_for(self.farmers[2])],
+            ['harrow', 'leveller'],
+        )
+        self.client.force_login(self.farmers[2])
+        self.assertContains(self.client.get(reverse('user_dashboard')), 'Recommended for You')
+
+
+# ---------- Demand forecast ----------
+@skipUnless(analytics.np is not None, "numpy is not installed")
+class DemandForecastTests(RentalFixtureMixin, TransactionTestCase):
+    """Forecasts extend each category's trend; the report renders on admin_analytics"""
+
+    # The replica connection only sees committed rows, so the test data must be committed
+    databases = {'default', 'replica'}
+    ITEM = {'name': 'Knapsack Sprayer', 'category': 'Sprayers', 'description': 'Manual sprayer', 'price_per_day': Decimal('120.00')}
+
+    def test_forecast_continues_linear_trend(self):
+        np = analytics.np
+        weekly = np.array([np.arange(10, 50, 2), np.full(20, 7)])
+        predicted, slope = analytics.forecast(weekly, np.arange(20), np.arange(20, 23))
+
+        np.testing.assert_allclose(slope, [2, 0])
+        np.testing.assert_allclose(predicted, [[50, 52, 54], [7, 7, 7]])
+
+    def test_report_on_analytics_page(self):
+        RentalRequest.objects.create(user=self.farmer, item=self.item)
+        cache.clear()
+        self.client.force_login(self.admin)
+
+        response = self.client.get(reverse('admin_analytics'))
+
+        [row] = response.context['demand']['categories']
+        self.assertEqual((row['category'], row['items'], row['active'], row['history'][-1]), ('Sprayers', 1, 1, 1))
+        self.assertContains(response, 'demand-data')
+
+
+# ---------- Fleet utilization ----------
+@skipUnless(analytics.np is not None, "numpy is not installed")
+class UtilizationTests(RentalFixtureMixin, TestCase):
+    """Utilization counts each day an item was out once, within the requested window"""
+
+    def test_overlapping_intervals_count_once(self):
+        np = analytics.np
+        days = analytics.rented_days(np.array([0, 0, 0, 1]), np.array([0, 5, 3, 2]), np.array([4, 8, 6, 3]))
+        self.assertEqual(days.tolist(), [8, 1])
+
+    def test_report_over_window(self):
+        now = timezone.now()
+        AgricultureItem.objects.filter(pk=self.item.pk).update(created_at=now - timedelta(days=30))
+        rental = RentalRequest.objects.create(user=self.farmer, item=self.item, status='returned', return_date=now - timedelta(days=5))
+        RentalRequest.objects.filter(pk=rental.pk).update(request_date=now - timedelta(days=10))
+
+        # Out from day -10 to day -5, but the window only starts at day -9
+        today = timezone.localdate()
+        report = analytics.utilization_report(today - timedelta(days=9), today)
+
+        [row] = report['items']
+        self.assertEqual((row['rented_days'], row['fleet_days'], row['utilization_pct']), (5, 10, 50.0))
+        self.assertEqual(report['categories'][0]['idle_days'], 5)
+
+    def test_rental_counts_from_approval(self):
+        now = timezone.now()
+        AgricultureItem.objects.filter(pk=self.item.pk).update(created_at=now - timedelta(days=30))
+        rental = RentalRequest.objects.create(user=self.farmer, item=self.item, status='returned', return_date=now - timedelta(days=5))
+        RentalRequest.objects.filter(pk=rental.pk).update(request_date=now - timedelta(days=10), approved_at=now - timedelta(days=7))
+
+        # Requested on day -10 but only out from its approval on day -7 to day -5
+        today = timezone.localdate()
+        [row] = analytics.utilization_report(today - timedelta(days=9), today)['items']
+        self.assertEqual((row['rented_days'], row['fleet_days']), (3, 10))
+
+
+# ---------- Price suggestions ----------
+@skipUnless(pricing.np is not None, "numpy is not installed")
+class PricingTests(TransactionTestCase):
+    """Busy items with a waiting list are suggested a higher price that admins can apply"""
+
+    # The replica connection only sees committed rows, so the test data must be committed
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.admin = CustomUser.objects.create_user('admin', 'admin@example.com', role='admin')
+        farmer = CustomUser.objects.create_user('farmer', 'farmer@example.com', status='approved')
+        self.busy, self.idle = [
+            AgricultureItem.objects.create(
+                name=name, category='Seeders', description=name, price_per_day=Decimal('1000.00'), added_by=self.admin,
+            )
+            for name in ('Busy Seeder', 'Idle Seeder')
+        ]
+        now = timezone.now()
+        AgricultureItem.objects.update(created_at=now - timedelta(days=60))
+        rental = RentalRequest.objects.create(user=farmer, item=self.busy, status='approved')
+        RentalRequest.objects.filter(pk=rental.pk).update(request_date=now - timedelta(days=40))
+        StockNotification.objects.create(user=farmer, item=self.busy)
+
+    def test_suggests_and_applies_prices(self):
+        suggestions = {row['id']: row for row in pricing.suggest_prices()}
+
+        self.assertGreater(suggestions[self.busy.id]['suggested_price'], Decimal('1000.00'))
+        self.assertLess(suggestions[self.idle.id]['suggested_price'], Decimal('1000.00'))
+        self.assertIn("1 farmer waiting for it", suggestions[self.busy.id]['reasons'])
+
+        self.client.force_login(self.admin)
+        self.assertContains(self.client.get(reverse('admin_pricing')), 'Busy Seeder')
+        self.client.post(reverse('apply_suggested_prices'), {'ids': [self.busy.id], f'price_{self.busy.id}': '1150'})
+        self.busy.refresh_from_db()
+        self.idle.refresh_from_db()
+        self.assertEqual((self.busy.price_per_day, self.idle.price_per_day), (Decimal('1150.00'), Decimal('1000.00')))
+
+
+# ---------- Nearest equipment ----------
+class NearestItemTests(TestCase):
+    """Nearest search returns the closest available items, nearest first"""
+
+    @classmethod
+    def setUpTestData(cls):
+        admin = CustomUser.objects.create_user('admin', 'admin@example.com', role='admin')
+        places = {
+            'Pune Tiller': (18.52, 73.86, True),
+            'Hadapsar Seeder': (18.50, 73.93, True),  # about 8 km from Pune, in another grid cell
+            'Lonavala Sprayer': (18.75, 73.41, True),
+            'Pune Harrow': (18.53, 73.85, False),
+            'Delhi Plough': (28.61, 77.21, True),
+        }
+        for name, (latitude, longitude, available) in places.items():
+            AgricultureItem.objects.create(
+                name=name, category='Ploughs', description=name, price_per_day=Decimal('500.00'),
+                added_by=admin, latitude=latitude, longitude=longitude, is_available=available,
+            )
+
+    def test_nearest_available_first(self):
+        items = nearest_available_items(18.52, 73.855, k=3)
+        self.assertEqual([item.name for item in items], ['Pune Tiller', 'Hadapsar Seeder', 'Lonavala Sprayer'])
+        self.assertLess(items[0].distance_km, 1)
+        # Delhi is over 1000 km away
+        self.assertEqual(len(nearest_available_items(18.52, 73.855, k=10)), 3)
+
+    def test_api(self):
+        response = self.client.get(reverse('api_items_nearest'), {'lat': 18.52, 'lng': 73.855, 'k': 1})
+        self.assertEqual([row['name'] for row in response.json()['results']], ['Pune Tiller'])
+        self.assertEqual(self.client.get(reverse('api_items_nearest'), {'lat': 120, 'lng': 0}).status_code, 400)
+
+    def test_high_latitudes_match_brute_force(self):
+        rng = random.Random(7)
+        admin = CustomUser.objects.get(username='admin')
+        AgricultureItem.objects.bulk_create(
+            AgricultureItem(
+                name=f'Arctic {i}', category='Ploughs', description='', price_per_day=Decimal('500.00'),
+                added_by=admin, latitude=latitude, longitude=longitude, grid_cell=grid_cell(latitude, longitude),
+            )
+            for i, (latitude, longitude) in enumerate(
+                (rng.uniform(55, 90), rng.uniform(-180, 180)) for _ in range(600)
+            )
+        )
+        items = list(AgricultureItem.objects.filter(is_available=True).values_list('id', 'latitude', 'longitude'))
+        # Includes points at the pole, where only whole grid rows can be searched
+        for lat, lng in [(rng.uniform(55, 89), rng.uniform(-180, 180)) for _ in range(25)] + [(89.95, 10.0)]:
+            k, max_km = rng.choice([1, 3, 10]), rng.choice([50, 150, 500])
+            distances = haversine_km(lat, lng, [row[1] for row in items], [row[2] for row in items])
+            expected = sorted((d, item_id) for d, (item_id, _, _) in zip(distances, items) if d <= max_km)[:k]
+            found = nearest_available_items(lat, lng, k=k, max_km=max_km)
+            self.assertEqual([item.id for item in found], [item_id for _, item_id in expected], (lat, lng, k, max_km))
+
+
+# ---------- Rental archive ----------
+class RentalArchiveTests(RentalFixtureMixin, TransactionTestCase):
+    """Settled rentals move to the archive and stay readable and counted"""
+
+    # The replica connection only sees committed rows, so the test data must be committed
+    databases = {'default', 'replica'}
+    ITEM = {'name': 'Rotavator', 'category': 'Ploughs', 'description': 'Five foot rotavator', 'price_per_day': Decimal('800.00')}
+
+    def setUp(self):
+        super().setUp()
+        farmer, item = self.farmer, self.item
+        self.old = old = timezone.now() - timedelta(days=400)
+        self.settled = RentalRequest.objects.create(user=farmer, item=item, status='returned', advance_paid=True, return_date=old)
+        # Refund still owed, recently returned, and still out: all stay live
+        RentalRequest.objects.create(user=farmer, item=item, status='returned', return_date=old, refund_amount=Decimal('200.00'))
+        RentalRequest.objects.create(user=farmer, item=item, status='returned', return_date=timezone.now())
+        RentalRequest.objects.create(user=farmer, item=item, status='approved')
+        RentalRequest.objects.filter(pk=self.settled.pk).update(request_date=old)
+
+    def test_archive_moves_settled_rentals(self):
+        self.assertEqual(sum(archive_rentals(days=180, batch_size=1)), 1)
+
+        archived = ArchivedRentalRequest.objects.get()
+        self.assertEqual((archived.id, archived.request_date), (self.settled.id, self.old))
+        self.assertEqual(RentalRequest.objects.count(), 3)
+        self.assertEqual(reconcile_counters(), [])
+
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get(reverse('download_invoice', args=[self.settled.id]))['Content-Type'], 'application/pdf')
+        self.assertEqual(self.client.get(reverse('admin_analytics')).context['total_rentals'], 4)
+
+
+# ---------- Read replica routing ----------
+class ReplicaRouterTests(TransactionTestCase):
+    """Only reads inside replica_reads() go to the replica, and never inside a transaction"""
+
+    # TestCase runs every test inside a transaction, where reads never use the replica
+
+    databases = {'default', 'replica'}
+
+    def test_routing(self):
+        self.assertEqual(RentalRequest.objects.all().db, 'default')
+        with replica_reads():
+            self.assertEqual(RentalRequest.objects.all().db, 'replica')
+            self.assertEqual(router.db_for_write(RentalRequest), 'default')
+            with transaction.atomic():
+                self.assertEqual(RentalRequest.objects.all().db, 'default')
+        self.assertEqual(RentalRequest.objects.all().db, 'default')
+
+
+# ---------- Payment reconciliation ----------
+class ReconciliationTests(RentalFixtureMixin, TestCase):
+    """Statement credits match rentals by note, UTR, or amount and time"""
+
+    ITEM = {'name': 'Power Weeder', 'category': 'Weeders', 'description': 'Petrol power weeder', 'price_per_day': Decimal('800.00')}
+
+    def setUp(self):
+        super().setUp()
+        farmer, item = self.farmer, self.item
+        self.paid_at = timezone.now().replace(microsecond=0)
+        self.by_note, self.by_utr, self.by_time = (
+            RentalRequest.objects.create(
+                user=farmer, item=item, status='approved', terms_accepted=True, daily_rate=rate, **extra,
+            )
+            for rate, extra in (
+                (Decimal('800.00'), {}),
+                (Decimal('600.00'), {'payment_reference': '412345678901', 'advance_paid': True}),
+                (Decimal('500.00'), {'paid_at': self.paid_at}),
+            )
+        )
+
+    def test_reconcile_and_verify(self):
+        when = timezone.localtime(self.paid_at).strftime('%d-%m-%Y %H:%M:%S')
+        statement = [
+            "Account Statement,XXXX1234",
+            "Txn Date,Narration,UTR,Debit,Credit,Balance",
+            f"{when},UPI/CR/{self.by_note.payment_note}/PhonePe,398765432101,,400.00,400.00",
+            f"{when},UPI/CR/farmer,412345678901,,300.00,700.00",
+            f"{when},UPI/CR/farmer,455555555555,,250.00,950.00",
+            f"{when},UPI/CR/unknown,466666666666,,999.00,1949.00",
+            f"{when},ATM WDL,,500.00,,1449.00",
+        ]
+        index = PaymentIndex.awaiting_verification()
+        counts, unmatched = reconcile_statement(statement, index)
+        self.assertEqual(counts, {
+            'matched by note': 1, 'matched by reference': 1, 'matched by amount and time': 1,
+            'unmatched': 1, 'skipped': 1,
+        })
+        self.assertEqual([line for line, _, _ in unmatched], [6])
+
+        self.assertEqual(mark_verified(index.matched), 3)
+        self.assertFalse(RentalRequest.objects.filter(payment_verified_at__isnull=True).exists())
+        self.assertEqual(RentalRequest.objects.get(pk=self.by_note.pk).payment_reference, '398765432101')
+        # The UTR rental was already marked paid by the farmer; every match is logged as verified
+        events = Counter(RentalEvent.objects.values_list('event', flat=True))
+        self.assertEqual((events['paid'], events['verified']), (2, 3))
+        self.assertEqual(reconcile_counters(), [])
+
+        # A second run finds them verified and changes nothing
+        self.assertEqual(mark_verified({self.by_note.id: '000000000000'}), 0)
+        self.assertEqual(RentalRequest.objects.get(pk=self.by_note.pk).payment_reference, '398765432101')
+        self.assertEqual(RentalEvent.objects.filter(event='verified').count(), 3)
+
+
+# ---------- Rental event log ----------
+class RentalEventTests(RentalFixtureMixin, TestCase):
+    """Rental changes are logged with their transaction, a bulk action in one INSERT"""
+
+    ITEM = {'name': 'Baler', 'category': 'Harvesters', 'description': 'Square baler', 'price_per_day': Decimal('1500.00')}
+
+    def setUp(self):
+        super().setUp()
+        self.rentals = [
+            RentalRequest.objects.create(user=self.farmer, item=self.item, terms_accepted=True, advance_paid=True)
+            for _ in range(3)
+        ]
+        for rental in self.rentals:
+            record_event(rental.id, 'requested', 'pending', actor=self.farmer)
+
+    def test_bulk_approval_is_logged_in_one_insert(self):
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('bulk_rental_status', args=['approved']), {'ids': [r.id for r in self.rentals]})
+
+        inserts = [query for query in queries if query['sql'].startswith(f'INSERT INTO "{RentalEvent._meta.db_table}"')]
+        self.assertEqual(len(inserts), 1)
+        approvals = RentalEvent.objects.filter(to_status='approved', from_status='pending', actor=self.admin)
+        self.assertEqual(approvals.count(), 3)
+        self.assertEqual(time_to_status('approved')['count'], 3)
+        self.assertFalse(RentalRequest.objects.filter(approved_at__isnull=True).exists())
+
+    def test_rolled_back_events_are_dropped(self):
+        rental = self.rentals[0]
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            record_event(rental.id, 'status', 'rejected', 'pending')
+            raise RuntimeError
+        with transaction.atomic():
+            record_event(rental.id, 'status', 'approved', 'pending')
+
+        self.assertEqual(
+            list(RentalEvent.objects.filter(rental_id=rental.id).values_list('to_status', flat=True)),
+            ['pending', 'approved'],
+        )
+
+    def test_events_of_a_rolled_back_savepoint_are_dropped(self):
+        rental = self.rentals[0]
+        with transaction.atomic():
+            record_event(rental.id, 'status', 'approved', 'pending')
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                record_event(rental.id, 'status', 'rejected', 'pending')
+                raise RuntimeError
+            record_event(rental.id, 'paid', 'approved', 'approved')
+
+        self.assertEqual(
+            list(RentalEvent.objects.filter(rental_id=rental.id).values_list('to_status', 'event')),
+            [('pending', 'requested'), ('approved', 'status'), ('approved', 'paid')],
+        )
+
+
+# ---------- Rental state machine ----------
+class RentalTransitionTests(RentalFixtureMixin, TestCase):
+    """Each status change is one guarded UPDATE, so repeats and bad moves change nothing"""
+
+    def setUp(self):
+        super().setUp()
+        self.item.reserve()
+        self.rental = RentalRequest.objects.create(user=self.farmer, item=self.item, terms_accepted=True, advance_paid=True)
+
+    def test_repeated_approval_moves_once(self):
+        self.client.force_login(self.admin)
+        for _ in range(2):
+            self.client.get(reverse('change_rental_status', args=[self.rental.id, 'approved']))
+        self.client.get(reverse('change_rental_status', args=[self.rental.id, 'returned']))
+
+        self.rental.refresh_from_db()
+        self.assertEqual(self.rental.status, 'approved')
+        approval = RentalEvent.objects.get(rental_id=self.rental.id, to_status='approved')
+        self.assertAlmostEqual(self.rental.approved_at, approval.created_at, delta=timedelta(seconds=1))
+        self.assertFalse(transition(self.rental, 'rejected'))
+        with self.assertRaises(InvalidTransition):
+            transition(self.rental, 'pending')
+
+    def test_stale_instance_counts_and_logs_the_stored_state(self):
+        stale = RentalRequest.objects.get(pk=self.rental.pk)
+        transition(self.rental, 'approved')
+        self.rental.return_condition = 'damaged'
+        self.rental.save()
+
+        self.assertTrue(transition(stale, 'returned', is_returned=True, return_condition='damaged'))
+        self.assertEqual(stale.status, 'returned')
+        event = RentalEvent.objects.get(rental_id=self.rental.id, to_status='returned')
+        self.assertEqual(event.from_status, 'approved')
+        self.assertEqual(reconcile_counters(), [])
+
+    def test_return_frees_item_once(self):
+        transition(self.rental, 'approved')
+        self.assertTrue(self.rental.mark_as_returned(condition='good'))
+        self.assertFalse(RentalRequest.objects.get(pk=self.rental.pk).mark_as_returned(condition='damaged'))
+
+        self.item.refresh_from_db()
+        self.rental.refresh_from_db()
+        self.assertTrue(self.item.is_available)
+        self.assertEqual((self.rental.status, self.rental.return_condition, self.rental.refund_amount), ('returned', 'good', 175))
+        self.assertEqual(reconcile_counters(), [])
+
+    def test_damage_form_only_makes_allowed_moves(self):
+        self.client.force_login(self.admin)
+        url = reverse('update_rental_damage', args=[self.rental.id])
+        self.client.post(url, {'status': 'returned', 'damage_report': 'Bent disc'})
+        self.rental.refresh_from_db()
+        self.assertEqual((self.rental.status, self.rental.damage_report), ('pending', None))
+
+        transition(self.rental, 'approved')
+        self.client.post(url, {'status': 'returned', 'damage_report': 'Bent disc'})
+        self.rental.refresh_from_db()
+        self.item.refresh_from_db()
+        self.assertEqual((self.rental.status, self.rental.damage_report), ('returned', 'Bent disc'))
+        self.assertTrue(self.item.is_available)
+        self.assertTrue(RentalEvent.objects.filter(rental_id=self.rental.id, to_status='returned').exists())
+
+    def test_repeated_refund_credits_wallet_once(self):
+        transition(self.rental, 'approved')
+        self.rental.mark_as_returned(condition='good')
+        self.client.force_login(self.admin)
+        for _ in range(2):
+            self.client.get(reverse('process_refund', args=[self.rental.id]))
+
+        self.farmer.refresh_from_db()
+        self.assertEqual(self.farmer.wallet_balance, self.rental.calculate_refund_amount())
+        self.assertEqual(RentalEvent.objects.filter(rental_id=self.rental.id, event='refunded').count(), 1)
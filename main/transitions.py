@@ -0,0 +1,101 @@
+"""Rental status changes, defined once and applied with conditional UPDATEs.
+
+TRANSITIONS lists every status a rental can move to, the statuses it may
+move from and any other condition the row must meet. transition() applies
+one as a single ``UPDATE ... WHERE id = ? AND status IN (allowed from)``
+and reports whether the row matched, so two admins clicking at once, or a
+repeated click, move a rental only once. bulk_transition() does the same
+for many rentals in one UPDATE.
+
+update() skips the model signals, so both move the item counters
+(main/counters.py) and log the change (main/events.py) themselves.
+"""
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .counters import RENTAL_STATE_FIELDS, apply_counter_deltas, rental_contribution
+from .events import new_event, record_event, record_events
+from .models import RentalRequest
+
+# Target status: (statuses it may be reached from, condition the row must also meet)
+TRANSITIONS = {
+    'approved': (('pending',), Q(terms_accepted=True, advance_paid=True)),
+    'rejected': (('pending',), Q()),
+    'returned': (('approved',), Q(is_returned=False)),
+    'damaged': (('returned',), Q(is_returned=True)),
+}
+# Target status: field stamped with the time a rental reaches it
+STATUS_TIMESTAMPS = {'approved': 'approved_at'}
+# Statuses an admin sets directly on a rental request
+DECISION_STATUSES = ('approved', 'rejected')
+
+
+class InvalidTransition(Exception):
+    """No rental can move to the requested status"""
+
+
+def allowed_rentals(status):
+    """Rentals that may move to ``status`` right now"""
+    if status not in TRANSITIONS:
+        raise InvalidTransition(f"Rentals cannot be moved to '{status}'")
+    sources, condition = TRANSITIONS[status]
+    return RentalRequest.objects.filter(condition, status__in=sources)
+
+
+def _stamped(status, fields):
+    """``fields`` plus the time a rental reaches ``status``, if it records one"""
+    if status in STATUS_TIMESTAMPS:
+        return {STATUS_TIMESTAMPS[status]: timezone.now(), **fields}
+    return fields
+
+
+def _contribution(state):
+    return rental_contribution(state['status'], state['advance_paid'], state['return_condition'], state['advance_amount'])
+
+
+def _counter_deltas(old, new):
+    before, after = _contribution(old), _contribution(new)
+    return {field: after[field] - before[field] for field in after}
+
+
+def transition(rental, status, actor=None, event='status', note='', **fields):
+    """Move one rental to ``status``, also setting ``fields``, if it is allowed to.
+
+    Returns True if this call moved it; the instance is then updated to match.
+    """
+    rentals = allowed_rentals(status).filter(pk=rental.pk)
+    fields = _stamped(status, fields)
+    with transaction.atomic():
+        # The instance may be stale: lock the row and count and log the state
+        # the UPDATE actually changes
+        old = rentals.select_for_update().values(*RENTAL_STATE_FIELDS).first()
+        if old is None or not rentals.update(status=status, **fields):
+            return False
+        new = {**old, **fields, 'status': status}
+        apply_counter_deltas(old['item_id'], _counter_deltas(old, new))
+        record_event(rental.id, event, status, old['status'], actor=actor, note=note)
+    rental.status = status
+    for field, value in fields.items():
+        setattr(rental, field, value)
+    return True
+
+
+def bulk_transition(ids, status, actor=None, event='status'):
+    """Move every rental in ``ids`` that is allowed to ``status``; returns how many moved"""
+    rentals = allowed_rentals(status).filter(id__in=ids)
+    with transaction.atomic():
+        # Lock the matched rows so the counter changes equal what the UPDATE does
+        matched = list(rentals.select_for_update().values('id', *RENTAL_STATE_FIELDS))
+        updated = rentals.update(status=status, **_stamped(status, {}))
+        deltas = defaultdict(Counter)
+        events = []
+        for old in matched:
+            deltas[old['item_id']].update(_counter_deltas(old, {**old, 'status': status}))
+            events.append(new_event(old['id'], event, status, old['status'], actor=actor))
+        for item_id, changes in deltas.items():
+            apply_counter_deltas(item_id, changes)
+        record_events(events)
+    return updated
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import views, metrics
 
 urlpatterns = [
     # Landing and info pages
@@ -21,6 +21,7 @@ urlpatterns = [
     # Dashboards
     path('user/dashboard/', views.user_dashboard, name='user_dashboard'),
     path('admin/dashboard/', views.admin_dashboard, name='admin_dashboard'),
+    path('admin/dashboard/<str:section>/', views.admin_dashboard_section, name='admin_dashboard_section'),
     
     # Aadhaar verification
     path('aadhaar/verification/', views.aadhaar_verification, name='aadhaar_verification'),
@@ -41,14 +42,24 @@ urlpatterns = [
     path('admin/verify-aadhaar/<int:user_id>/', views.verify_aadhaar, name='verify_aadhaar'),
     path('admin/reject-aadhaar/<int:user_id>/', views.reject_aadhaar, name='reject_aadhaar'),
     
+    # Bulk admin actions (POST with the selected ids)
+    path('admin/bulk/rentals/<str:status>/', views.bulk_rental_status, name='bulk_rental_status'),
+    path('admin/bulk/users/<str:status>/', views.bulk_user_status, name='bulk_user_status'),
+    path('admin/bulk/verify-aadhaar/', views.bulk_verify_aadhaar, name='bulk_verify_aadhaar'),
+    path('admin/bulk/items/<str:availability>/', views.bulk_item_availability, name='bulk_item_availability'),
+    
     # Invoice and analytics
     path('admin/invoice/download/<int:rental_id>/', views.download_invoice, name='download_invoice'),
     path('admin/invoice/email/<int:rental_id>/', views.send_invoice_email, name='send_invoice_email'),
     path('admin/analytics/', views.admin_analytics, name='admin_analytics'),
+    path('admin/pricing/', views.admin_pricing, name='admin_pricing'),
+    path('admin/pricing/apply/', views.apply_suggested_prices, name='apply_suggested_prices'),
+    path('admin/export/<str:dataset>/', views.admin_export, name='admin_export'),
     path('return-rental/<int:rental_id>/', views.return_rental, name='return_rental'),
     path('admin/process-return/<int:rental_id>/', views.admin_process_return, name='admin_process_return'),
     path('admin/process-refund/<int:rental_id>/', views.process_refund, name='process_refund'),
     path('user/wallet/', views.user_wallet, name='user_wallet'),
+    path('user/location/', views.set_user_location, name='set_user_location'),
     
     # Notification URLs
     path('mark-notifications-read/', views.mark_notifications_read, name='mark_notifications_read'),
@@ -56,4 +67,11 @@ urlpatterns = [
     path('remove-stock-notification/<int:notification_id>/', views.remove_stock_notification, name='remove_stock_notification'),
     path('admin/edit-item/<int:item_id>/', views.edit_item, name='edit_item'),
     path('admin/delete-item/<int:item_id>/', views.delete_item, name='delete_item'),
+    
+    # Read-only JSON API
+    path('api/items/', views.api_items, name='api_items'),
+    path('api/items/nearest/', views.api_items_nearest, name='api_items_nearest'),
+    
+    # Prometheus scrape endpoint
+    path('metrics', metrics.metrics_view, name='metrics'),
 ]
\ No newline at end of file
@@ -2,19 +2,25 @@ from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
-from django.core.mail import send_mail
 from .models import CustomUser, AgricultureItem, RentalRequest, StockNotification
 from .forms import SignupForm, OTPVerifyForm, AgricultureItemForm, OTPRequestForm
-import random
 
 # Add these new imports at the top
 from django.shortcuts import get_object_or_404
-from django.http import HttpResponse
+from django.core.paginator import Paginator
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse, Http404
 from django.template.loader import render_to_string
 from django.utils import timezone
-from django.db.models import Count, Sum, Q
+from django.db import transaction
+from django.db.models import Count, Sum, Max, Q, F
+from django.views.decorators.http import condition, require_safe, require_POST
+from django.core.serializers.json import DjangoJSONEncoder
+from django.conf import settings
 from datetime import datetime, timedelta
 import json
+import hashlib
+import asyncio
+from collections import Counter
 from io import BytesIO
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
@@ -26,24 +32,35 @@ from decimal import Decimal, InvalidOperation
 
 # Import the new Aadhaar form
 from .forms import AadhaarVerificationForm
+from .caching import anonymous_page_cache, fragment_cache_context
+from .analytics import demand_report, utilization_report
+from .archive import RENTAL_MODELS, get_rental_or_404, rental_history
+from .events import record_event, time_to_status
+from .pricing import apply_prices, suggest_prices
+from .recommendations import recommendations_for
+from .routers import replica_reads
+from .transitions import DECISION_STATUSES, InvalidTransition, bulk_transition, transition
+from .exports import EXPORTS, EXPORT_FORMATS, export_lines
+from .geo import DEFAULT_MAX_KM, nearest_available_items
+from .mail import asend_mail, asend_message
+from .otp import PENDING_COOKIE, PENDING_COOKIE_SALT, allow_otp_send, issue_otp, check_otp
+from . import metrics
+from asgiref.sync import sync_to_async
 
 # ------------------ ADMIN CREDENTIALS ------------------
 ADMIN_USERNAME = "admin"
 ADMIN_PASSWORD = "admin123"
 
-# ------------------ HELPER ------------------
-def generate_otp():
-    """Generate a 7-digit numeric OTP"""
-    return str(random.randint(1000000, 9999999))
-
-
 # ------------------ LANDING / INFO PAGES ------------------
+@anonymous_page_cache
 def landing_page(request):
     return render(request, 'landing.html')
 
+@anonymous_page_cache
 def about_page(request):
     return render(request, 'about.html')
 
+@anonymous_page_cache
 def contact_page(request):
     return render(request, 'contact.html')
 
@@ -88,32 +105,40 @@ def user_signup(request):
 
 
 # ------------------ SIGNIN (Request OTP) ------------------
-def user_signin(request):
+async def user_signin(request):
+    """Async so that waiting on the SMTP server does not hold a worker"""
     if request.method == 'POST':
         form = OTPRequestForm(request.POST)
         if form.is_valid():
             username = form.cleaned_data['username']
             email = form.cleaned_data['email']
+            # Throttle before touching the database or the mail server
+            if not await sync_to_async(allow_otp_send)(username, request.META.get('REMOTE_ADDR')):
+                messages.error(request, "Too many OTP requests. Please try again in a few minutes.")
+                return await sync_to_async(render)(request, 'user_request_otp.html', {'form': form}, status=429)
             try:
-                user = CustomUser.objects.get(username=username, email=email, role='user')
-                otp = generate_otp()
-                request.session['user_otp'] = otp
-                request.session['user_id'] = user.id
+                user = await CustomUser.objects.aget(username=username, email=email, role='user')
+                otp = await sync_to_async(issue_otp)(user.id)
                 # Send OTP via email
-                send_mail(
+                await asend_mail(
                     subject='Your Agri-RentX OTP',
                     message=f'Hello {user.username}, your OTP is: {otp}',
-                    from_email=None,
                     recipient_list=[user.email],
-                    fail_silently=False,
                 )
                 messages.success(request, "OTP sent to your email!")
-                return redirect('user_verify_otp')
+                response = redirect('user_verify_otp')
+                # A signed cookie rather than the session: no session row per OTP request
+                response.set_signed_cookie(
+                    PENDING_COOKIE, user.id, salt=PENDING_COOKIE_SALT,
+                    max_age=settings.OTP_TTL, httponly=True, samesite='Lax',
+                )
+                return response
             except CustomUser.DoesNotExist:
                 messages.error(request, "Invalid username or email.")
     else:
         form = OTPRequestForm()
-    return render(request, 'user_request_otp.html', {'form': form})
+    # Rendering reads the session for messages, which is sync-only
+    return await sync_to_async(render)(request, 'user_request_otp.html', {'form': form})
 
 
 def admin_signin(request):
@@ -155,8 +180,9 @@ def admin_signin(request):
 
 # ------------------ OTP VERIFY ------------------
 def user_verify_otp(request):
-    # Check if OTP was actually requested (session exists)
-    if 'user_otp' not in request.session or 'user_id' not in request.session:
+    # Check if OTP was actually requested (pending cookie exists)
+    user_id = request.get_signed_cookie(PENDING_COOKIE, None, salt=PENDING_COOKIE_SALT, max_age=settings.OTP_TTL)
+    if user_id is None:
         messages.error(request, "Please request an OTP first")
         return redirect('user_signin')
     
@@ -164,28 +190,21 @@ def user_verify_otp(request):
         form = OTPVerifyForm(request.POST)
         if form.is_valid():
             otp = form.cleaned_data['otp']
-            session_otp = request.session.get('user_otp')
-            user_id = request.session.get('user_id')
             
-            if otp == session_otp:
+            if check_otp(user_id, otp):
                 try:
                     user = CustomUser.objects.get(id=user_id, role='user')
                     login(request, user, backend='django.contrib.auth.backends.ModelBackend')
                     
-                    # Clean up session
-                    if 'user_otp' in request.session:
-                        del request.session['user_otp']
-                    if 'user_id' in request.session:
-                        del request.session['user_id']
-                    request.session.save()
-                    
                     messages.success(request, "Login successful!")
-                    return redirect('user_dashboard')
+                    response = redirect('user_dashboard')
+                    response.delete_cookie(PENDING_COOKIE, samesite='Lax')
+                    return response
                 except CustomUser.DoesNotExist:
                     messages.error(request, "User not found")
                     return redirect('user_signin')
             else:
-                messages.error(request, "Invalid OTP")
+                messages.error(request, "Invalid or expired OTP")
     else:
         form = OTPVerifyForm()
     
@@ -291,6 +310,10 @@ def user_dashboard(request):
         'now': timezone.now(),
         'deadline_notifications': deadline_notifications,  # NEW
         'back_in_stock_notifications': back_in_stock_notifications,  # NEW
+        'recommended_items': recommendations_for(request.user),
+        'nearest_items': _nearest_items_for(request.user),
+        'nearest_max_km': DEFAULT_MAX_KM,
+        'fragment_cache': fragment_cache_context(request),
     }
     return render(request, 'user_dashboard.html', context)
 
@@ -301,23 +324,17 @@ def admin_dashboard(request):
         messages.error(request, "Access denied")
         return redirect('admin_signin')
 
-    # Import here to avoid circular imports
-    from .models import RentalRequest, AgricultureItem
-
-    users = CustomUser.objects.filter(role='user')
-    items = AgricultureItem.objects.all()
-    rental_requests = RentalRequest.objects.all()
-    
-    # NEW: Get Aadhaar verification requests
-    pending_verifications = CustomUser.objects.filter(
-        role='user', 
-        is_aadhaar_verified=False
-    ).exclude(aadhaar_number__isnull=True).exclude(aadhaar_number='')
-    
-    verified_users = CustomUser.objects.filter(role='user', is_aadhaar_verified=True)
-
-    # NEW: Get stock alerts
-    out_of_stock_items = AgricultureItem.objects.filter(is_available=False)
+    # Only the headline counters; the sections load separately (admin_dashboard_section)
+    counts = CustomUser.objects.filter(role='user').aggregate(
+        users=Count('id'),
+        pending_verifications=Count('id', filter=Q(is_aadhaar_verified=False, aadhaar_number__gt='')),
+        verified_users=Count('id', filter=Q(is_aadhaar_verified=True)),
+    )
+    counts.update(AgricultureItem.objects.aggregate(
+        items=Count('id'),
+        out_of_stock=Count('id', filter=Q(is_available=False)),
+    ))
+    counts['rentals'] = RentalRequest.objects.count()
     
     # NEW: Get pending back-in-stock notifications count
     pending_notifications_count = StockNotification.objects.filter(notified=False).count()
@@ -343,19 +360,58 @@ def admin_dashboard(request):
         form = AgricultureItemForm()
 
     context = {
-        'users': users,
-        'items': items,
-        'rental_requests': rental_requests,
-        'pending_verifications': pending_verifications,
-        'verified_users': verified_users,
+        'counts': counts,
         'form': form,
         'now': timezone.now(),
-        'out_of_stock_items': out_of_stock_items,  # NEW
         'pending_notifications_count': pending_notifications_count,  # NEW
     }
     return render(request, 'admin_dashboard.html', context)
 
 
+# ------------------ ADMIN DASHBOARD SECTIONS ------------------
+ADMIN_SECTION_PAGE_SIZE = 25
+
+
+def _pending_verifications():
+    """Users who uploaded an Aadhaar that is not verified yet"""
+    return CustomUser.objects.filter(
+        role='user',
+        is_aadhaar_verified=False
+    ).exclude(aadhaar_number__isnull=True).exclude(aadhaar_number='')
+
+
+# section -> (template variable, queryset factory)
+ADMIN_SECTIONS = {
+    'rentals': ('rental_requests', lambda: RentalRequest.objects.select_related('user', 'item')),
+    'pending_aadhaar': ('pending_verifications', lambda: _pending_verifications().order_by('id')),
+    'verified_users': ('verified_users', lambda: CustomUser.objects.filter(role='user', is_aadhaar_verified=True).order_by('id')),
+    'users': ('users', lambda: CustomUser.objects.filter(role='user').order_by('id')),
+    'items': ('items', lambda: AgricultureItem.objects.order_by('id')),
+    'out_of_stock': ('out_of_stock_items', lambda: AgricultureItem.objects.filter(is_available=False).order_by('id')),
+}
+
+
+@login_required
+def admin_dashboard_section(request, section):
+    """One page of a dashboard section, rendered as an HTML fragment"""
+    if request.user.role != 'admin':
+        messages.error(request, "Access denied")
+        return redirect('admin_signin')
+    if section not in ADMIN_SECTIONS:
+        raise Http404("Unknown dashboard section")
+    
+    name, queryset = ADMIN_SECTIONS[section]
+    page = Paginator(queryset(), ADMIN_SECTION_PAGE_SIZE).get_page(request.GET.get('page'))
+    context = {
+        name: page.object_list,
+        'page': page,
+        'section': section,
+        'now': timezone.now(),
+        'fragment_cache': fragment_cache_context(request),
+    }
+    return render(request, f'admin_sections/{section}.html', context)
+
+
 # ------------------ RENTAL PROCESS ------------------
 @login_required
 def rental_terms(request, item_id):
@@ -426,17 +482,21 @@ def accept_terms(request, item_id):
         messages.info(request, "You already have a request for this item.")
         return redirect('user_dashboard')
     
-    # Create rental request with terms accepted
-    rental = RentalRequest.objects.create(
-        user=request.user,
-        item=item,
-        status='pending',
-        terms_accepted=True
-    )
-    
-    # Make item unavailable when rented
-    item.is_available = False
-    item.save()
+    # Claim the item and create the rental together, so a rental only exists
+    # when this request actually won the item
+    with transaction.atomic():
+        if not item.reserve():
+            messages.warning(request, f"Sorry, {item.name} is no longer available.")
+            return redirect('user_dashboard')
+
+        # Create rental request with terms accepted
+        rental = RentalRequest.objects.create(
+            user=request.user,
+            item=item,
+            status='pending',
+            terms_accepted=True
+        )
+        record_event(rental.id, 'requested', rental.status, actor=request.user)
     
     messages.success(request, "Terms accepted! Please proceed with advance payment.")
     return redirect('rental_payment', rental_id=rental.id)
@@ -464,8 +524,8 @@ def rental_payment(request, rental_id):
         messages.info(request, "Payment already completed for this rental.")
         return redirect('user_dashboard')
     
-    # Calculate advance payment (50% of daily rate)
-    advance_amount = rental.item.price_per_day * Decimal('0.5')
+    # Advance payment (50% of the daily rate when the rental was requested)
+    advance_amount = rental.advance_amount
     
     context = {
         'rental': rental,
@@ -497,9 +557,15 @@ def process_payment(request, rental_id):
             messages.error(request, "Invalid payment method.")
             return redirect('rental_payment', rental_id=rental_id)
 
-        # Mark advance as paid
+        # Mark advance as paid; reconcile_payments verifies it against the statement
         rental.advance_paid = True
-        rental.save()
+        rental.paid_at = timezone.now()
+        reference = request.POST.get('payment_reference', '').strip()
+        if reference:
+            rental.payment_reference = reference[:100]
+        with transaction.atomic():
+            rental.save()
+            record_event(rental.id, 'paid', rental.status, rental.status, actor=request.user, note=reference)
 
         messages.success(request, "Payment successful! Redirecting to dashboard.")
         return redirect('user_dashboard')
@@ -561,15 +627,25 @@ def change_user_status(request, user_id, status):
 
 
 @login_required
-def change_item_availability(request, item_id):
+async def change_item_availability(request, item_id):
     """Change item availability status"""
-    if request.user.role != 'admin':
+    user = await request.auser()
+    if user.role != 'admin':
         messages.error(request, "Access denied")
         return redirect('admin_signin')
 
-    item = get_object_or_404(AgricultureItem, id=item_id)
+    try:
+        item = await AgricultureItem.objects.aget(id=item_id)
+    except AgricultureItem.DoesNotExist:
+        raise Http404("No AgricultureItem matches the given query.")
     item.is_available = not item.is_available
-    item.save()
+    # update() instead of save(), which would mail the subscribers one by one
+    await AgricultureItem.objects.filter(pk=item.pk).aupdate(
+        is_available=item.is_available,
+        updated_at=timezone.now(),
+    )
+    if item.is_available:
+        await item.anotify_subscribed_users()
     
     status = "available" if item.is_available else "unavailable"
     messages.success(request, f"Item '{item.name}' is now {status}.")
@@ -582,16 +658,22 @@ def change_rental_status(request, rental_id, status):
         messages.error(request, "Access denied")
         return redirect('admin_signin')
 
-    rental = get_object_or_404(RentalRequest, id=rental_id)
+    if status not in DECISION_STATUSES:
+        messages.error(request, "Invalid rental status")
+        return redirect('admin_dashboard')
+
+    rental = get_object_or_404(RentalRequest.objects.select_related('user', 'item'), id=rental_id)
 
     # Check if terms & advance payment are completed before approving
     if status == 'approved' and not (rental.terms_accepted and rental.advance_paid):
         messages.warning(request, f"Cannot approve: '{rental.user.username}' has not accepted terms or made advance payment.")
         return redirect('admin_dashboard')
 
-    rental.status = status
-    rental.save()
-    messages.success(request, f"Rental request for '{rental.item.name}' by '{rental.user.username}' updated to {status}.")
+    # The UPDATE itself checks the rental is still pending, so a second click changes nothing
+    if transition(rental, status, actor=request.user):
+        messages.success(request, f"Rental request for '{rental.item.name}' by '{rental.user.username}' updated to {status}.")
+    else:
+        messages.info(request, f"Rental request for '{rental.item.name}' by '{rental.user.username}' was already decided.")
     return redirect('admin_dashboard')
 
 
@@ -601,12 +683,28 @@ def update_rental_damage(request, rental_id):
         messages.error(request, "Access denied")
         return redirect('admin_signin')
 
-    rental = get_object_or_404(RentalRequest, id=rental_id)
+    rental = get_object_or_404(RentalRequest.objects.select_related('user', 'item'), id=rental_id)
     from .forms import RentalManagementForm
     form = RentalManagementForm(request.POST or None, instance=rental)
 
     if request.method == 'POST' and form.is_valid():
-        form.save()
+        status = request.POST.get('status') or rental.status
+        previous = rental.status
+        with transaction.atomic():
+            if status != previous:
+                # Only the moves TRANSITIONS allows; a return also frees the item
+                try:
+                    if status == 'returned':
+                        moved = rental.mark_as_returned(actor=request.user)
+                    else:
+                        moved = transition(rental, status, actor=request.user)
+                except InvalidTransition:
+                    moved = False
+                if not moved:
+                    messages.error(request, f"Rental '{rental.item.name}' cannot move from {previous} to {status}.")
+                    return redirect('admin_dashboard')
+            # Only the form's own fields, never a stale status
+            form.save(commit=False).save(update_fields=RentalManagementForm.Meta.fields)
         messages.success(request, f"Rental '{rental.item.name}' updated with damage/penalty info.")
         return redirect('admin_dashboard')
 
@@ -655,6 +753,104 @@ def reject_aadhaar(request, user_id):
     return redirect('admin_dashboard')
 
 
+# ------------------ BULK ADMIN ACTIONS ------------------
+# Each action applies to every ticked row with a single UPDATE. Eligibility
+# checks live in the UPDATE's WHERE clause, so rows that do not qualify are
+# simply left alone and reported as skipped.
+BULK_STATUSES = ('approved', 'rejected')
+
+
+def _selected_ids(request):
+    """Row IDs ticked in a bulk action form"""
+    return {int(value) for value in request.POST.getlist('ids') if value.isdigit()}
+
+
+def _bulk_summary(request, updated, selected, action):
+    if not selected:
+        messages.warning(request, "No rows selected.")
+        return
+    skipped = len(selected) - updated
+    summary = f"{updated} {action}"
+    if skipped:
+        summary += f", {skipped} skipped (already done or not eligible)"
+    messages.success(request, summary + ".")
+
+
+@login_required
+@require_POST
+def bulk_rental_status(request, status):
+    """Approve or reject many pending rental requests at once"""
+    if request.user.role != 'admin':
+        messages.error(request, "Access denied")
+        return redirect('admin_signin')
+    if status not in DECISION_STATUSES:
+        messages.error(request, "Invalid rental status")
+        return redirect('admin_dashboard')
+
+    selected = _selected_ids(request)
+    # Same rules as change_rental_status, checked in the UPDATE's WHERE clause
+    updated = bulk_transition(selected, status, actor=request.user)
+    _bulk_summary(request, updated, selected, f"rental requests {status}")
+    return redirect('admin_dashboard')
+
+
+@login_required
+@require_POST
+def bulk_user_status(request, status):
+    """Approve or reject many user accounts at once"""
+    if request.user.role != 'admin':
+        messages.error(request, "Access denied")
+        return redirect('admin_signin')
+    if status not in BULK_STATUSES:
+        messages.error(request, "Invalid user status")
+        return redirect('admin_dashboard')
+
+    selected = _selected_ids(request)
+    updated = CustomUser.objects.filter(id__in=selected, role='user').exclude(status=status).update(status=status)
+    _bulk_summary(request, updated, selected, f"users {status}")
+    return redirect('admin_dashboard')
+
+
+@login_required
+@require_POST
+def bulk_verify_aadhaar(request):
+    """Verify the Aadhaar of many users who have submitted one"""
+    if request.user.role != 'admin':
+        messages.error(request, "Access denied")
+        return redirect('admin_signin')
+
+    selected = _selected_ids(request)
+    updated = (
+        CustomUser.objects.filter(id__in=selected, role='user', is_aadhaar_verified=False)
+        .exclude(aadhaar_number__isnull=True).exclude(aadhaar_number='')
+        .update(is_aadhaar_verified=True, aadhaar_verification_date=timezone.now())
+    )
+    _bulk_summary(request, updated, selected, "Aadhaar verifications approved")
+    return redirect('admin_dashboard')
+
+
+@login_required
+@require_POST
+async def bulk_item_availability(request, availability):
+    """Mark many items available or unavailable; restocked items notify their subscribers"""
+    user = await request.auser()
+    if user.role != 'admin':
+        messages.error(request, "Access denied")
+        return redirect('admin_signin')
+    if availability not in ('available', 'unavailable'):
+        messages.error(request, "Invalid availability")
+        return redirect('admin_dashboard')
+
+    is_available = availability == 'available'
+    selected = _selected_ids(request)
+    items = AgricultureItem.objects.filter(id__in=selected).exclude(is_available=is_available)
+    restocked = [item async for item in items] if is_available else []
+    updated = await items.aupdate(is_available=is_available, updated_at=timezone.now())
+    await asyncio.gather(*(item.anotify_subscribed_users() for item in restocked))
+    _bulk_summary(request, updated, selected, f"items marked {availability}")
+    return redirect('admin_dashboard')
+
+
 # ------------------ INVOICE GENERATION ------------------
 @login_required
 def generate_invoice_pdf(request, rental_id):
@@ -663,7 +859,7 @@ def generate_invoice_pdf(request, rental_id):
         messages.error(request, "Access denied")
         return redirect('admin_signin')
     
-    rental = get_object_or_404(RentalRequest, id=rental_id)
+    rental = get_rental_or_404(rental_id)  # invoices stay available after archiving
     
     # Create PDF buffer
     buffer = BytesIO()
@@ -733,8 +929,8 @@ def generate_invoice_pdf(request, rental_id):
     # Rental Details
     elements.append(Paragraph("RENTAL DETAILS:", heading_style))
     
-    # Calculate amounts using Decimal
-    advance_amount = (rental.item.price_per_day * Decimal('0.5')).quantize(Decimal('0.01'))
+    # Amounts were captured on the rental when it was requested
+    advance_amount = rental.advance_amount
     penalty_amount = rental.penalty_amount if rental.penalty_amount else Decimal('0')
     total_amount = advance_amount + penalty_amount
     
@@ -742,7 +938,7 @@ def generate_invoice_pdf(request, rental_id):
         ["Description", "Amount"],
         [f"Equipment: {rental.item.name}", ""],
         [f"Category: {rental.item.category}", ""],
-        [f"Daily Rate: ₹{rental.item.price_per_day}", ""],
+        [f"Daily Rate: ₹{rental.daily_rate}", ""],
         ["Advance Payment (50%)", f"₹{advance_amount:.2f}"],
     ]
     
@@ -785,7 +981,8 @@ def generate_invoice_pdf(request, rental_id):
     elements.append(Paragraph("Thank you for choosing Agri-RentX!", normal_style))
     
     # Build PDF
-    doc.build(elements)
+    with metrics.track('invoice_pdf'):
+        doc.build(elements)
     
     # Get PDF value from buffer
     pdf = buffer.getvalue()
@@ -811,23 +1008,23 @@ def download_invoice(request, rental_id):
         return redirect('admin_dashboard')
 
 @login_required
-def send_invoice_email(request, rental_id):
+async def send_invoice_email(request, rental_id):
     """Send invoice to user via email"""
-    if request.user.role != 'admin':
+    user = await request.auser()
+    if user.role != 'admin':
         messages.error(request, "Access denied")
         return redirect('admin_signin')
     
-    rental = get_object_or_404(RentalRequest, id=rental_id)
+    rental = await sync_to_async(get_rental_or_404)(rental_id)
     
     try:
         # Generate PDF
-        pdf_content = generate_invoice_pdf(request, rental_id)
+        pdf_content = await sync_to_async(generate_invoice_pdf)(request, rental_id)
         
         # Send email with PDF attachment
         from django.core.mail import EmailMessage
         
-        # Calculate amounts for email body using Decimal
-        advance_amount = (rental.item.price_per_day * Decimal('0.5')).quantize(Decimal('0.01'))
+        advance_amount = rental.advance_amount
         penalty_amount = rental.penalty_amount if rental.penalty_amount else Decimal('0')
         total_amount = advance_amount + penalty_amount
         
@@ -856,7 +1053,7 @@ Agri-RentX Team
         )
         
         email.attach(f'agrirentx_invoice_{rental_id}.pdf', pdf_content, 'application/pdf')
-        email.send()
+        await asend_message(email)
         
         messages.success(request, f"Invoice sent successfully to {rental.user.email}")
     
@@ -867,7 +1064,28 @@ Agri-RentX Team
 
 
 # ------------------ ANALYTICS ------------------
+UTILIZATION_DEFAULT_DAYS = 90
+
+
+def _utilization_window(request):
+    """The util_from/util_to dates from the query string, defaulting to the last 90 days"""
+    today = timezone.localdate()
+    start, end = today - timedelta(days=UTILIZATION_DEFAULT_DAYS - 1), today
+    try:
+        if request.GET.get('util_from'):
+            start = datetime.strptime(request.GET['util_from'], '%Y-%m-%d').date()
+        if request.GET.get('util_to'):
+            end = min(datetime.strptime(request.GET['util_to'], '%Y-%m-%d').date(), today)
+    except ValueError:
+        messages.error(request, "Invalid utilization dates; showing the last 90 days")
+        return today - timedelta(days=UTILIZATION_DEFAULT_DAYS - 1), today
+    if start > end:
+        start, end = end, start
+    return start, end
+
+
 @login_required
+@replica_reads()
 def admin_analytics(request):
     """Admin analytics dashboard"""
     if request.user.role != 'admin':
@@ -880,7 +1098,8 @@ def admin_analytics(request):
     # Basic counts
     total_users = CustomUser.objects.filter(role='user').count()
     total_items = AgricultureItem.objects.count()
-    total_rentals = RentalRequest.objects.count()
+    # Rental totals cover the archive as well as the live table
+    total_rentals = sum(model.objects.count() for model in RENTAL_MODELS)
     
     # Status breakdowns - FIXED: Use correct fields
     user_status = CustomUser.objects.filter(role='user').values('status').annotate(count=Count('id'))
@@ -888,27 +1107,25 @@ def admin_analytics(request):
     # FIX: AgricultureItem doesn't have 'status' field, use 'is_available' instead
     item_status = AgricultureItem.objects.values('is_available').annotate(count=Count('id'))
     
-    rental_status = RentalRequest.objects.values('status').annotate(count=Count('id'))
-    
-    # Revenue analytics - FIXED: Use Decimal for calculations
-    total_revenue_result = RentalRequest.objects.filter(advance_paid=True).aggregate(
-        total=Sum('item__price_per_day')
-    )
+    rental_status = Counter()
+    for status, count in rental_history(lambda rentals: rentals.values_list('status').annotate(count=Count('id'))):
+        rental_status[status] += count
+    rental_status = [{'status': status, 'count': count} for status, count in rental_status.items()]
     
-    # Convert to Decimal and calculate 50% advance
-    total_revenue = Decimal('0')
-    if total_revenue_result['total']:
-        total_revenue = (Decimal(str(total_revenue_result['total'])) * Decimal('0.5')).quantize(Decimal('0.01'))
+    # Revenue analytics: advances are summed per item as they are paid
+    total_revenue = AgricultureItem.objects.aggregate(total=Sum('advance_revenue'))['total'] or Decimal('0')
     
     pending_payments = RentalRequest.objects.filter(
         terms_accepted=True, 
         advance_paid=False
     ).count()
     
-    # Category analytics
+    # Category analytics, read from the per-item rental counters
     category_stats = AgricultureItem.objects.values('category').annotate(
         count=Count('id'),
-        total_rentals=Count('rentalrequest')
+        total_rentals=Sum('rental_count'),
+        active_rentals=Sum('active_rental_count'),
+        damaged_rentals=Sum('damage_count'),
     )
     
     # Recent activity
@@ -918,19 +1135,14 @@ def admin_analytics(request):
     approved_rentals = RentalRequest.objects.filter(status='approved').count()
     pending_rentals = RentalRequest.objects.filter(status='pending').count()
     
-    # Calculate revenue by status
-    revenue_by_status = {}
-    for status in ['approved', 'pending', 'returned']:
-        result = RentalRequest.objects.filter(
-            status=status, 
-            advance_paid=True
-        ).aggregate(
-            revenue=Sum('item__price_per_day')
-        )
-        revenue = Decimal('0')
-        if result['revenue']:
-            revenue = (Decimal(str(result['revenue'])) * Decimal('0.5')).quantize(Decimal('0.01'))
-        revenue_by_status[status] = revenue
+    # Revenue by status from the advance captured on each rental, no join
+    revenue_by_status = dict.fromkeys(['approved', 'pending', 'returned'], Decimal('0'))
+    paid_by_status = rental_history(
+        lambda rentals: rentals.filter(status__in=revenue_by_status, advance_paid=True)
+        .values_list('status').annotate(revenue=Sum('advance_amount'))
+    )
+    for status, revenue in paid_by_status:
+        revenue_by_status[status] += revenue
     
     context = {
         'total_users': total_users,
@@ -946,12 +1158,73 @@ def admin_analytics(request):
         'approved_rentals': approved_rentals,
         'pending_rentals': pending_rentals,
         'revenue_by_status': revenue_by_status,
+        'demand': demand_report(),
+        # Request to approval over the last 90 days, from the rental event log
+        'approval_time': time_to_status('approved', since=timezone.now() - timedelta(days=90)),
+        'utilization': utilization_report(*_utilization_window(request)),
         'now': timezone.now(),  # Add current time
     }
     
     return render(request, 'admin_analytics.html', context)
 
 
+# ------------------ PRICING ------------------
+@login_required
+@replica_reads()
+def admin_pricing(request):
+    """Suggested daily prices for the whole catalog, with their reasons"""
+    if request.user.role != 'admin':
+        messages.error(request, "Access denied")
+        return redirect('admin_signin')
+
+    context = {
+        'suggestions': suggest_prices(),
+        'window_days': settings.PRICING_WINDOW_DAYS,
+        'now': timezone.now(),
+    }
+    return render(request, 'admin_pricing.html', context)
+
+
+@login_required
+@require_POST
+def apply_suggested_prices(request):
+    """Apply the ticked price suggestions, as shown or as edited by the admin"""
+    if request.user.role != 'admin':
+        messages.error(request, "Access denied")
+        return redirect('admin_signin')
+
+    selected = _selected_ids(request)
+    new_prices = {}
+    for item_id in selected:
+        try:
+            price = Decimal(request.POST.get(f'price_{item_id}', '')).quantize(Decimal('0.01'))
+        except InvalidOperation:
+            continue
+        if Decimal('0') < price < Decimal('1000000'):
+            new_prices[item_id] = price
+    updated = apply_prices(new_prices)
+    _bulk_summary(request, updated, selected, "prices updated")
+    return redirect('admin_pricing')
+
+
+# ------------------ DATA EXPORT ------------------
+@login_required
+def admin_export(request, dataset):
+    """Stream a dataset to the admin as CSV or NDJSON"""
+    if request.user.role != 'admin':
+        messages.error(request, "Access denied")
+        return redirect('admin_signin')
+    
+    fmt = request.GET.get('format', 'csv')
+    if dataset not in EXPORTS or fmt not in EXPORT_FORMATS:
+        raise Http404("Unknown export")
+    
+    response = StreamingHttpResponse(export_lines(dataset, fmt), content_type=EXPORT_FORMATS[fmt])
+    filename = f"agrirentx_{dataset}_{timezone.now():%Y%m%d}.{fmt}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
 # ------------------ RETURN FUNCTIONALITY ------------------
 @login_required
 def return_rental(request, rental_id):
@@ -975,8 +1248,10 @@ def return_rental(request, rental_id):
         condition = request.POST.get('condition', 'good')
         notes = request.POST.get('notes', '')
         
-        # Mark as returned
-        rental.mark_as_returned(condition=condition, notes=notes)
+        # Mark as returned; a repeated submit finds the rental already returned
+        if not rental.mark_as_returned(condition=condition, notes=notes, actor=request.user):
+            messages.info(request, "This item has already been returned.")
+            return redirect('user_dashboard')
         
         messages.success(request, f"Successfully returned {rental.item.name}. Thank you!")
         return redirect('user_dashboard')
@@ -993,7 +1268,7 @@ def admin_process_return(request, rental_id):
         messages.error(request, "Access denied")
         return redirect('admin_signin')
     
-    rental = get_object_or_404(RentalRequest, id=rental_id)
+    rental = get_object_or_404(RentalRequest.objects.select_related('user', 'item'), id=rental_id)
     
     if not rental.is_returned:
         messages.error(request, "This item has not been returned by the user yet.")
@@ -1003,20 +1278,30 @@ def admin_process_return(request, rental_id):
         # Admin can add final notes or adjust penalty
         penalty_amount = request.POST.get('penalty_amount', 0)
         admin_notes = request.POST.get('admin_notes', '')
+        fields = {}
         
         if penalty_amount:
             try:
-                rental.penalty_amount = Decimal(penalty_amount)
-                if Decimal(penalty_amount) > 0:
-                    rental.status = 'damaged'  # Change status to damaged if penalty applied
+                fields['penalty_amount'] = Decimal(penalty_amount)
             except (ValueError, InvalidOperation):
                 messages.error(request, "Invalid penalty amount")
                 return redirect('admin_process_return', rental_id=rental_id)
         
         if admin_notes:
-            rental.admin_return_notes = admin_notes
+            fields['admin_return_notes'] = admin_notes
         
-        rental.save()
+        note = f"Penalty ₹{fields['penalty_amount']}" if fields.get('penalty_amount') else ''
+        damaged = False
+        if fields.get('penalty_amount', 0) > 0:
+            # Change status to damaged if penalty applied, in the same UPDATE
+            damaged = transition(rental, 'damaged', actor=request.user, event='return_processed', note=note, **fields)
+        if fields and not damaged:
+            # Already damaged, or no penalty: only the details change
+            with transaction.atomic():
+                for field, value in fields.items():
+                    setattr(rental, field, value)
+                rental.save(update_fields=list(fields))
+                record_event(rental.id, 'return_processed', rental.status, rental.status, actor=request.user, note=note)
         
         # Calculate and show refund amount
         refund_amount = rental.calculate_refund_amount()
@@ -1044,7 +1329,7 @@ def process_refund(request, rental_id):
         messages.error(request, "Access denied")
         return redirect('admin_signin')
     
-    rental = get_object_or_404(RentalRequest, id=rental_id)
+    rental = get_object_or_404(RentalRequest.objects.select_related('user', 'item'), id=rental_id)
     
     # Check if rental can be refunded
     if not rental.is_returned:
@@ -1062,17 +1347,19 @@ def process_refund(request, rental_id):
         messages.warning(request, "No refund available due to penalty charges.")
         return redirect('admin_dashboard')
     
-    # Process refund - FIXED: This was the main issue
+    # Process refund: claim the rental with a conditional UPDATE so a double
+    # click or two admins credit the wallet only once
     try:
-        # Update rental status first
-        rental.refund_processed = True
-        rental.refund_amount = refund_amount
-        rental.refund_date = timezone.now()
-        rental.save()
-        
-        # Update user's wallet balance
-        rental.user.wallet_balance += refund_amount
-        rental.user.save()
+        with transaction.atomic():
+            claimed = RentalRequest.objects.filter(pk=rental.pk, is_returned=True, refund_processed=False).update(
+                refund_processed=True, refund_amount=refund_amount, refund_date=timezone.now(),
+            )
+            if claimed:
+                CustomUser.objects.filter(pk=rental.user_id).update(wallet_balance=F('wallet_balance') + refund_amount)
+                record_event(rental.id, 'refunded', rental.status, rental.status, actor=request.user, note=f"₹{refund_amount}")
+        if not claimed:
+            messages.info(request, "Refund already processed for this rental.")
+            return redirect('admin_dashboard')
         
         messages.success(request, f"Successfully refunded ₹{refund_amount} to {rental.user.username}'s wallet.")
         
@@ -1088,11 +1375,16 @@ def user_wallet(request):
         messages.error(request, "Access denied")
         return redirect('user_signin')
     
-    # Get user's rentals with refunds
-    rentals_with_refunds = RentalRequest.objects.filter(
-        user=request.user, 
-        refund_processed=True
-    ).order_by('-refund_date')
+    # Get user's rentals with refunds, archived ones included
+    rentals_with_refunds = sorted(
+        (
+            rental
+            for model in RENTAL_MODELS
+            for rental in model.objects.filter(user=request.user, refund_processed=True).select_related('item')
+        ),
+        key=lambda rental: rental.refund_date or rental.request_date,
+        reverse=True,
+    )
     
     context = {
         'wallet_balance': request.user.get_wallet_balance(),
@@ -1102,6 +1394,45 @@ def user_wallet(request):
     return render(request, 'user_wallet.html', context)
 
 
+# ------------------ NEAREST EQUIPMENT ------------------
+NEAREST_DASHBOARD_ITEMS = 6
+
+
+def _nearest_items_for(user):
+    if user.latitude is None or user.longitude is None:
+        return []
+    return nearest_available_items(user.latitude, user.longitude, k=NEAREST_DASHBOARD_ITEMS)
+
+
+def _coordinates(data):
+    """(latitude, longitude) from request data, or None when missing or out of range"""
+    try:
+        latitude, longitude = float(data['latitude']), float(data['longitude'])
+    except (KeyError, ValueError):
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    return latitude, longitude
+
+
+@login_required
+@require_POST
+def set_user_location(request):
+    """Save the farmer's location for nearest-equipment search"""
+    if request.user.role != 'user':
+        messages.error(request, "Access denied")
+        return redirect('user_signin')
+
+    coordinates = _coordinates(request.POST)
+    if coordinates is None:
+        messages.error(request, "Could not read your location")
+        return redirect('user_dashboard')
+    request.user.latitude, request.user.longitude = coordinates
+    request.user.save(update_fields=['latitude', 'longitude'])
+    messages.success(request, "Location saved. Showing equipment near you.")
+    return redirect('user_dashboard')
+
+
 # ------------------ NEW ITEMS NOTIFICATION ------------------
 @login_required
 def mark_notifications_read(request):
@@ -1156,7 +1487,7 @@ def delete_item(request, item_id):
     item_name = item.name
     
     # Check if item has any rental requests
-    has_rentals = RentalRequest.objects.filter(item=item).exists()
+    has_rentals = any(model.objects.filter(item=item).exists() for model in RENTAL_MODELS)
     
     if has_rentals:
         messages.error(request, f"Cannot delete '{item_name}' because it has rental requests. Mark it as unavailable instead.")
@@ -1170,4 +1501,96 @@ def delete_item(request, item_id):
     context = {
         'item': item,
     }
-    return render(request, 'delete_item_confirm.html', context)
\ No newline at end of file
+    return render(request, 'delete_item_confirm.html', context)
+
+
+# ------------------ JSON CATALOG API ------------------
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 200
+API_ITEM_FIELDS = ('id', 'name', 'category', 'description', 'price_per_day', 'image', 'is_available', 'updated_at')
+
+
+def _api_items_queryset(request):
+    """Items matching the category/available filters of an API request"""
+    items = AgricultureItem.objects.all()
+    category = request.GET.get('category')
+    if category:
+        items = items.filter(category=category)
+    available = request.GET.get('available', '').lower()
+    if available in ('1', 'true'):
+        items = items.filter(is_available=True)
+    elif available in ('0', 'false'):
+        items = items.filter(is_available=False)
+    return items
+
+
+def _api_items_etag(request):
+    """ETag from the newest update and row count, so unchanged catalogs cost one aggregate query"""
+    stats = _api_items_queryset(request).aggregate(last_modified=Max('updated_at'), count=Count('id'))
+    raw = f"{stats['last_modified']}|{stats['count']}|{request.GET.urlencode()}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+@require_safe
+@condition(etag_func=_api_items_etag)
+def api_items(request):
+    """Read-only JSON catalog with cursor pagination"""
+    try:
+        cursor = int(request.GET.get('cursor', 0))
+        limit = min(int(request.GET.get('limit', API_PAGE_SIZE)), API_MAX_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({'error': 'cursor and limit must be integers'}, status=400)
+    if limit < 1:
+        return JsonResponse({'error': 'limit must be positive'}, status=400)
+
+    # Fetch one extra row to know whether another page follows
+    rows = list(
+        _api_items_queryset(request)
+        .filter(id__gt=cursor)
+        .order_by('id')
+        .values(*API_ITEM_FIELDS)[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    for row in rows:
+        row['image'] = settings.MEDIA_URL + row['image'] if row['image'] else None
+
+    next_url = None
+    if has_more:
+        params = request.GET.copy()
+        params['cursor'] = rows[-1]['id']
+        next_url = f"{request.path}?{params.urlencode()}"
+
+    return JsonResponse(
+        {'results': rows, 'next': next_url},
+        encoder=DjangoJSONEncoder,
+        json_dumps_params={'separators': (',', ':')},
+    )
+
+
+@require_safe
+def api_items_nearest(request):
+    """Nearest available items to ?lat=&lng=, with distances in km"""
+    coordinates = _coordinates({'latitude': request.GET.get('lat'), 'longitude': request.GET.get('lng')})
+    if coordinates is None:
+        return JsonResponse({'error': 'lat and lng must be valid coordinates'}, status=400)
+    try:
+        k = min(int(request.GET.get('k', API_PAGE_SIZE)), API_MAX_PAGE_SIZE)
+        max_km = float(request.GET.get('max_km', DEFAULT_MAX_KM))
+    except ValueError:
+        return JsonResponse({'error': 'k and max_km must be numbers'}, status=400)
+    if k < 1 or max_km <= 0:
+        return JsonResponse({'error': 'k and max_km must be positive'}, status=400)
+
+    items = nearest_available_items(*coordinates, k=k, category=request.GET.get('category'), max_km=max_km)
+    rows = []
+    for item in items:
+        row = {field: getattr(item, field) for field in API_ITEM_FIELDS}
+        row['image'] = item.image.url if item.image else None
+        row.update(latitude=item.latitude, longitude=item.longitude, distance_km=item.distance_km)
+        rows.append(row)
+    return JsonResponse(
+        {'results': rows},
+        encoder=DjangoJSONEncoder,
+        json_dumps_params={'separators': (',', ':')},
+    )